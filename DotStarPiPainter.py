@@ -36,14 +36,24 @@
 # --------------------------------------------------------------------------
 
 import os
-import select
 import signal
 import time
-import RPi.GPIO as GPIO
-from dotstar import Adafruit_DotStar
-from evdev import InputDevice, ecodes
+from stripbackend import openStrip, loadBitrate, headless
+if headless(): # No Pi: stand-in buttons and mouse (see standins.py)
+	from standins import GPIO, InputDevice, mousePresent
+else:
+	import RPi.GPIO as GPIO
+	from evdev import InputDevice
+	mousePresent = os.path.exists
 from lightpaint import LightPaint
 from PIL import Image
+from imagecache import ImageCache
+from paintcache import PaintCache
+from scanner import ImageScanner
+from pipeline import PaintPipeline
+from buttons import Buttons, PRESS, REPEAT, RELEASE
+from eventloop import EventLoop
+from encoder import Encoder
 
 # CONFIGURABLE STUFF -------------------------------------------------------
 
@@ -59,12 +69,18 @@ vflip      = 'true' # 'true' if strip input at bottom, else 'false'
 # DotStar strip data & clock MUST connect to hardware SPI pins
 # (GPIO 10 & 11).  12000000 (12 MHz) is the SPI clock rate; this is the
 # fastest I could reliably operate a 288-pixel strip without glitching.
-# You can try faster, or may need to set it lower, no telling.
+# You can try faster, or may need to set it lower, no telling; run
+# calibrate.py to find the best rate for your strip, which is then used
+# instead (saved in bitrate_file).
 # If using older (pre-2015) DotStar strips, declare "order='gbr'" above
-# for correct color order.
-strip = Adafruit_DotStar(num_leds, 12000000, order=order)
-
-path      = '/media/usb'         # USB stick mount point
+# for correct color order.  Set DOTSTAR_BACKEND=memory or file:<path> in
+# the environment to record frames instead (see stripbackend.py); the
+# buttons and mouse are then stand-ins too (see standins.py), so this
+# runs without a Pi.
+bitrate_file = '/var/lib/lightpaint/bitrate'
+strip = openStrip(num_leds, loadBitrate(bitrate_file, 12000000), order=order)
+
+path      = os.environ.get('LIGHTPAINT_USB', '/media/usb') # USB stick mount
 mousefile = '/dev/input/mouse0'  # Mouse device (as positional encoder)
 eventfile = '/dev/input/event0'  # Mouse events accumulate here
 dev       = None                 # None unless mouse is detected
@@ -72,112 +88,135 @@ dev       = None                 # None unless mouse is detected
 gamma          = (2.8, 2.8, 2.8) # Gamma correction curves for R,G,B
 color_balance  = (128, 255, 180) # Max brightness for R,G,B (white balance)
 power_settings = (1450, 1550)    # Battery avg and peak current
+global_brightness = False        # True: power limit with the LEDs' 5-bit
+                                 # brightness field, keeping color depth
+cache_budget   = 32 * 1024 * 1024 # Bytes of loaded images to keep ready
+cache_dir      = os.environ.get('LIGHTPAINT_CACHE',
+                   '/var/cache/lightpaint') # Processed images saved here
+cache_limit    = 256 * 1024 * 1024 # Most disk space they may take
 
 # INITIALIZATION -----------------------------------------------------------
 
 # Set control pins to inputs and enable pull-up resistors.
 # Buttons should connect between these pins and ground.
+# Edge callbacks queue debounced press/repeat/release events for them,
+# numbered 1-5 in this order.
 GPIO.setmode(GPIO.BCM)
-GPIO.setup(pin_go    , GPIO.IN, pull_up_down=GPIO.PUD_UP)
-GPIO.setup(pin_prev  , GPIO.IN, pull_up_down=GPIO.PUD_UP)
-GPIO.setup(pin_next  , GPIO.IN, pull_up_down=GPIO.PUD_UP)
-GPIO.setup(pin_slower, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-GPIO.setup(pin_faster, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+buttons = Buttons(GPIO, [pin_go, pin_faster, pin_slower, pin_next, pin_prev])
+
+# Buttons, USB signals and timers are all dispatched from this;
+# see the main loop.
+loop = EventLoop()
 
 strip.begin() # Initialize SPI pins for output
 
-ledBuf     = strip.getPixels() # Pointer to 'raw' LED strip data
+pipeline   = PaintPipeline(strip, num_leds) # Renders while showing
 clearBuf   = bytearray([0xFF, 0, 0, 0] * num_leds)
 imgNum     = 0    # Index of currently-active image
 duration   = 2.0  # Image paint time, in seconds
 filename   = None # List of image files (nothing loaded yet)
 lightpaint = None # LightPaint object for currently-active image (none yet)
-
-# If a mouse is plugged in, set up epoll for sensing position
-if os.path.exists(mousefile):
-	dev = InputDevice(eventfile)
-	# Register mouse descriptor with epoll
-	epoll = select.epoll()
-	epoll.register(dev.fileno(), select.EPOLLIN)
+scan       = None # USB drive scan in progress, if any (see scandir())
+goHeld     = False # Go button is down (paint() repeats while it is)
+
+# If a mouse is plugged in, read it on a thread for sensing position
+encoder = None
+if mousePresent(mousefile):
+	dev     = InputDevice(eventfile)
+	encoder = Encoder(dev)
 	print 'Using mouse for positional input'
 
 
 # FUNCTIONS ----------------------------------------------------------------
 
-# Signal handler when SIGUSR1 is received (USB flash drive mounted,
-# triggered by usbmount and 99_lightpaint_mount script).
-def sigusr1_handler(signum, frame):
+# Run when SIGUSR1 is received (USB flash drive mounted, triggered by
+# usbmount and 99_lightpaint_mount script).  The event loop calls this
+# once the signal has arrived, never from inside the signal handler, so
+# it can't land in the middle of a paint sweep or a strip update.
+def usbMounted():
 	scandir()
 
 # Ditto for SIGUSR2 (USB drive removed -- clears image file list)
-def sigusr2_handler(signum, frame):
-	global filename
+def usbRemoved():
+	global filename, imgNum, scan
 	filename = None
+	scan     = None # Stops a scan that's still going
 	imgNum   = 0
+	imageCache.clear()
 	# Current LightPaint object is left resident
 
-# Scan root folder of USB drive for viable image files.
+# Scan root folder of USB drive for viable image files.  The scanner
+# only reads image headers, several at once, and remembers files it has
+# seen before, so a rescan only opens new or changed ones.  Images are
+# taken one at a time from the event loop, and the first one found is
+# loaded right away, so painting can start while the scan goes on.
 def scandir():
-	global imgNum, lightpaint, filename
-	files     = os.listdir(path)
-	num_files = len(files) # Total # of files, whether images or not
+	global imgNum, filename, scan
 	filename  = []         # Filename list of valid images
 	imgNum    = 0
-	if num_files == 0: return
-	for i, f in enumerate(files):
-		lower =  i      * num_leds / num_files
-		upper = (i + 1) * num_leds / num_files
-		for n in range(lower, upper):
-			strip.setPixelColor(n, 0x010100) # Yellow
-		strip.show()
-		if f[0] == '.': continue
-		try:    Image.open(os.path.join(path, f))
-		except: continue   # Is directory or non-image file; skip
-		filename.append(f) # Valid image, add to list
-		time.sleep(0.05)   # Tiny pause so progress bar is visible
-	strip.clear()
-	strip.show()
-	if len(filename) > 0:                  # Found some image files?
-		filename.sort()                # Sort list alphabetically
-		lightpaint = loadImage(imgNum) # Load first image
+	imageCache.clear()     # Files may have changed
+	scan      = scanner.scan(path)
+	loop.callLater(0, scanNext, scan)
+
+def scanNext(thisScan):
+	global imgNum
+	if thisScan is not scan: return # Rescanned or unmounted since
+	try:
+		f, size = next(thisScan)
+	except StopIteration:
+		clearStrip()
+		if len(filename) > 0:
+			# Sort list alphabetically, keeping the current image
+			current = filename[imgNum]
+			filename.sort()
+			imgNum  = filename.index(current)
+		return
+	upper = scanner.checked * num_leds / scanner.total
+	showBar(0, upper, 0x010100) # Yellow
+	filename.append(f) # Valid image, add to list
+	if len(filename) == 1: loadImage(0) # First image
+	loop.callLater(0, scanNext, thisScan)
 
 # Load image, do some conversion and processing as needed before painting.
-def loadImage(index):
-	num_images = len(filename)
-	lower      =  index      * num_leds / num_images
-	upper      = (index + 1) * num_leds / num_images
-	for n in range(lower, upper):
-		strip.setPixelColor(n, 0x010000) # Red = loading
-	strip.show()
-	print "Loading '" + filename[index] + "'..."
+# Runs on the image cache's background thread (see loadImage(); it also
+# prefetches the next and previous images), so this must not touch the
+# strip.  Returns the LightPaint object and roughly how much memory it
+# holds.
+def processImage(filepath):
+	print "Loading '" + os.path.basename(filepath) + "'..."
 	startTime = time.time()
-	# Load image, convert to RGB if needed
-	img = Image.open(os.path.join(path, filename[index])).convert("RGB")
-	print "\t%dx%d pixels" % img.size
-
-	# If necessary, image is vertically scaled to match LED strip.
-	# Width is NOT resized, this is on purpose.  Pixels need not be
-	# square!  This makes for higher-resolution painting on the X axis.
-	if img.size[1] != num_leds:
-		print "\tResizing...",
-		img = img.resize((img.size[0], num_leds), Image.BICUBIC)
-		print "now %dx%d pixels" % img.size
-
-	# Convert raw RGB pixel data to a string buffer.
-	# The C module can easily work with this format.
-	pixels = img.tostring()
+	# Resized pixels and LightPaint tables may already be on disk from
+	# an earlier run with the same image file and settings.
+	key   = paintCache.key(filepath)
+	entry = paintCache.get(key)
+	if entry:
+		pixels, size, tables = entry
+		print "\t%dx%d pixels (cached)" % size
+	else:
+		img = Image.open(filepath)
+		print "\t%dx%d pixels" % img.size
+
+		# Image is converted to RGB and, if necessary, vertically
+		# scaled to match LED strip, a chunk of columns at a time,
+		# straight into the disk cache (see paintcache.py).  Width is
+		# NOT resized, this is on purpose.  Pixels need not be square!
+		# This makes for higher-resolution painting on the X axis.
+		# Columns are stored in the order the C module reads them,
+		# so it can paint from the file (mapped into memory) as-is.
+		pixels, size = paintCache.convert(key, img, num_leds,
+		  vflip.lower() in ('true', '1'))
+		del img
+		tables = None # Computed by LightPaint
 	print "\t%f seconds" % (time.time() - startTime)
 
 	# Do external C processing on image; this provides 16-bit gamma
 	# correction, diffusion dithering and brightness adjustment to
 	# match power source capabilities.
-	for n in range(lower, upper):
-		strip.setPixelColor(n, 0x010100) # Yellow
-	strip.show()
 	print "Processing..."
 	startTime  = time.time()
 	# Pixel buffer, image size, gamma, color balance and power settings
-	# are REQUIRED arguments.  One or two additional arguments may
+	# are REQUIRED arguments.  "tables" passes the dither tables from the
+	# disk cache (None computes them).  One or two additional arguments may
 	# optionally be specified:  "order='gbr'" changes the DotStar LED
 	# color component order to be compatible with older strips (same
 	# setting needs to be present in the Adafruit_DotStar declaration
@@ -185,144 +224,220 @@ def loadImage(index):
 	# input end of the strip is at the bottom, rather than top (I
 	# prefer having the Pi at the bottom as it provides some weight).
 	# Returns a LightPaint object which is used later for dithering
-	# and display.
-	lightpaint = LightPaint(pixels, img.size, gamma, color_balance,
-	  power_settings, order=order, vflip=vflip)
+	# and display.  "globalBrightness" lets the power limit dim via the
+	# LEDs' own 5-bit brightness field (see lightpaint.c).
+	# "layout='columns'" says the pixels are already by column, as
+	# stored by the cache.
+	lightpaint = LightPaint(pixels, size, gamma, color_balance,
+	  power_settings, order=order, vflip=vflip, tables=tables,
+	  globalBrightness=global_brightness, layout='columns')
 	print "\t%f seconds" % (time.time() - startTime)
-
-	# Success!
-	for n in range(lower, upper):
-		strip.setPixelColor(n, 0x000100) # Green
+	if tables is None:
+		paintCache.put(key, size, lightpaint.getTables())
+	# LightPaint paints from the mapped file, which counts against the
+	# cache budget like the tables do: evicting the image is what
+	# unmaps the file and closes it, so it has to be evicted sometime.
+	return lightpaint, len(pixels) + size[1] * 3 + 256 * 9
+
+# Processed images on disk, keyed by image file and all settings above
+paintCache = PaintCache(cache_dir, cache_limit, gamma, color_balance,
+  power_settings, num_leds, order, vflip, global_brightness)
+
+# Ready-to-paint images, so next/prev and the slideshow don't stall
+imageCache = ImageCache(processImage, cache_budget)
+
+# Finds the images on the USB drive; see scandir()
+scanner = ImageScanner()
+
+# Progress bars and the speed setting are shown on the strip, except
+# while a sweep is painting: the strip is the render thread's until it's
+# done, and anything shown meanwhile would land in the middle of it.
+def showBar(lower, upper, color):
+	if pipeline.painting: return
+	strip.fill(lower, upper, color)
 	strip.show()
-	time.sleep(0.25) # Tiny delay so green 'ready' is visible
-	print "Ready!"
 
+def showSpeed():
+	if pipeline.painting: return
 	strip.clear()
+	strip.setPixelColor(speed_pixel, 0x000080)
 	strip.show()
-	return lightpaint
-
-def btn():
-	if not GPIO.input(pin_go):     return 1
-	if not GPIO.input(pin_faster): return 2
-	if not GPIO.input(pin_slower): return 3
-	if not GPIO.input(pin_next):   return 4
-	if not GPIO.input(pin_prev):   return 5
-	return 0
 
-# MAIN LOOP ----------------------------------------------------------------
-
-# Init some stuff for speed selection...
-max_time    = 10.0
-min_time    =  0.1
-time_range  = (max_time - min_time)
-speed_pixel = int(num_leds * (duration - min_time) / time_range)
-duration    = min_time + time_range * speed_pixel / (num_leds - 1)
-prev_btn    = 0
-rep_time    = 0.2
+def clearStrip():
+	if pipeline.painting: return
+	strip.clear()
+	strip.show()
 
-scandir() # USB drive might already be inserted
-signal.signal(signal.SIGUSR1, sigusr1_handler) # USB mount signal
-signal.signal(signal.SIGUSR2, sigusr2_handler) # USB unmount signal
+# Get image ready for painting.  Usually this is already done (by the
+# cache's prefetching); else the cache's thread loads it, with a red bar
+# shown meanwhile, and imageLoaded() puts it in place once it's ready.
+# Either way this returns right away: the event loop never waits on a
+# load.  Until the image is in place there's nothing to paint.
+def loadImage(index):
+	global lightpaint
+	num_images = len(filename)
+	filepath   = os.path.join(path, filename[index])
+	lightpaint = imageCache.fetch(filepath, onLoaded)
+	if lightpaint is None:
+		showBar(index * num_leds / num_images,
+		  (index + 1) * num_leds / num_images, 0x010000) # Red = loading
+	else:
+		print "Ready!"
+
+	# Start getting the neighboring images ready in the background
+	imageCache.prefetch([
+	  os.path.join(path, filename[(index + 1) % num_images]),
+	  os.path.join(path, filename[index - 1])])
+
+# Called on the image cache's thread when an image loadImage() asked for
+# is loaded; the event loop takes it from there.
+def onLoaded(filepath, image):
+	loop.callFromThread(imageLoaded, filepath, image)
+
+def imageLoaded(filepath, image):
+	global lightpaint
+	if not filename or os.path.join(path, filename[imgNum]) != filepath:
+		return # Another image (or USB drive) was picked meanwhile
+	lightpaint = image
+	if image is None: # Couldn't load it, see the cache's message
+		clearStrip()
+		return
+	num_images = len(filename)
+	showBar(imgNum * num_leds / num_images,
+	  (imgNum + 1) * num_leds / num_images, 0x000100) # Green
+	# Cleared by the event loop a moment later, so green 'ready'
+	# is visible without waiting here
+	loop.callLater(0.25, clearStrip)
+	print "Ready!"
 
-try:
-	while True:
-		b = btn()
-		if b == 1 and lightpaint != None:
-			# Paint!
-
-			if dev is None: # Time-based
-
-				startTime = time.time()
-				while True:
-					t1        = time.time()
-					elapsed   = t1 - startTime
-					if elapsed > duration: break
-					# dither() function is passed a
-					# destination buffer and a float
-					# from 0.0 to 1.0 indicating which
-					# column of the source image to
-					# render.  Interpolation happens.
-					lightpaint.dither(ledBuf,
-					  elapsed / duration)
-					strip.show(ledBuf)
-
-			else: # Encoder-based
-
-				mousepos = 0
-				scale    = 0.01 / (speed_pixel + 1)
-				while True:
-					input = epoll.poll(-1) # Non-blocking
-					for i in input: # For each pending...
-						try:
-							for event in dev.read():
-								if(event.type == ecodes.EV_REL and
-								   event.code == ecodes.REL_X):
-									mousepos += event.value
-						except:
-							# If this occurs, usually power settings
-							# are too high for battery source.
-							# Voltage sags, Pi loses track of USB device.
-							print 'LOST MOUSE CONNECTION'
-							continue
-
-					pos = abs(mousepos) * scale
-					if pos > 1.0: break
-					lightpaint.dither(ledBuf, pos)
-					strip.show(ledBuf)
-
-			if btn() != pin_go: # Button released?
-				strip.show(clearBuf)
-
-		elif b == 2:
-			# Decrease paint duration
+# Paint the current image, again and again while the go button is held.
+# This runs on the pipeline's render thread (see onButtons()), so the
+# event loop goes on meanwhile: buttons, USB signals and image loads are
+# handled mid-sweep.  All the sweep takes from the loop is the image to
+# paint, whether go is still held (goHeld) and when to stop early
+# (pipeline.stopping).
+def paint():
+	global encoder
+	while not pipeline.stopping:
+		image = lightpaint # Next/previous may change it meanwhile
+		if image is None: break
+		if encoder is None: # Time-based
+
+			sweepTime = duration # Speed changes apply next sweep
+			startTime = time.time()
+			while not pipeline.stopping:
+				t1        = time.time()
+				elapsed   = t1 - startTime
+				if elapsed > sweepTime: break
+				# dither() function is passed a
+				# destination buffer and a float
+				# from 0.0 to 1.0 indicating which
+				# column of the source image to
+				# render.  Interpolation happens.
+				# The previous column is still
+				# being sent meanwhile.
+				ledBuf = pipeline.buffer()
+				image.dither(ledBuf, elapsed / sweepTime)
+				pipeline.show(ledBuf)
+
+		else: # Encoder-based
+
+			encoder.reset()
+			scale = 0.01 / (speed_pixel + 1)
+			while not pipeline.stopping:
+				if encoder.lost:
+					# If this occurs, usually power settings
+					# are too high for battery source.
+					# Voltage sags, Pi loses track of USB device.
+					# It doesn't come back, so paint by time
+					# from here on.
+					print 'LOST MOUSE CONNECTION'
+					encoder.close()
+					encoder = None
+					break
+				if encoder.idle() > 0.1:
+					# Mouse stopped: nothing new to show, so
+					# wait for it (or for the button to be let go)
+					if not goHeld: break
+					encoder.wait(0.1)
+					continue
+				# Position is extrapolated between mouse
+				# reports, so columns go out as fast as
+				# the strip takes them, not just 125/sec
+				pos = abs(encoder.position()) * scale
+				if pos > 1.0: break
+				ledBuf = pipeline.buffer()
+				image.dither(ledBuf, pos)
+				pipeline.show(ledBuf)
+
+		pipeline.flush() # Last column out before clearing
+		if not goHeld: break # Held? Paint again
+	strip.show(clearBuf)
+
+# Handle whatever the buttons have done since last time.
+def onButtons():
+	global speed_pixel, duration, imgNum, goHeld
+	for kind, b in buttons.events():
+		if b == 1 and kind == PRESS:
+			goHeld = True
+			# Sweep goes on the render thread, this returns
+			# right away.  Pressed again during the last
+			# sweep of a hold, that one just repeats.
+			if lightpaint != None and not pipeline.painting:
+				pipeline.paint(paint)
+		elif b == 1 and kind == RELEASE:
+			goHeld = False
+		elif b == 2 and kind in (PRESS, REPEAT):
+			# Decrease paint duration (repeats, faster
+			# and faster, while the button is held)
 			if speed_pixel > 0:
 				speed_pixel -= 1
 				duration = (min_time + time_range *
 				  speed_pixel / (num_leds - 1))
-			strip.setPixelColor(speed_pixel, 0x000080)
-			strip.show()
-			startTime = time.time()
-			while (btn() == 2 and ((time.time() - startTime) <
-			  rep_time)): continue
-			strip.clear()
-			strip.show()
-		elif b == 3:
+			showSpeed()
+		elif b == 3 and kind in (PRESS, REPEAT):
 			# Increase paint duration (up to 10 sec maximum)
 			if speed_pixel < num_leds - 1:
 				speed_pixel += 1
 				duration = (min_time + time_range *
 				  speed_pixel / (num_leds - 1))
-			strip.setPixelColor(speed_pixel, 0x000080)
-			strip.show()
-			startTime = time.time()
-			while (btn() == 3 and ((time.time() - startTime) <
-			  rep_time)): continue
-			strip.clear()
-			strip.show()
-		elif b == 4 and filename != None:
+			showSpeed()
+		elif (b == 2 or b == 3) and kind == RELEASE:
+			clearStrip()
+		elif b == 4 and kind == PRESS and filename != None:
 			# Next image (if USB drive present)
 			imgNum += 1
 			if imgNum >= len(filename): imgNum = 0
-			lightpaint = loadImage(imgNum)
-			while btn() == 4: continue
-		elif b == 5 and filename != None:
+			loadImage(imgNum)
+		elif b == 5 and kind == PRESS and filename != None:
 			# Previous image (if USB drive present)
 			imgNum -= 1
 			if imgNum < 0: imgNum = len(filename) - 1
-			lightpaint = loadImage(imgNum)
-			while btn() == 5: continue
-		if b > 0 and b == prev_btn:
-			# If button held, accelerate speed selection
-			rep_time *= 0.92
-			if rep_time < 0.01: rep_time = 0.01
-		else:
-			rep_time = 0.2
-		prev_btn = b
+			loadImage(imgNum)
+
+# MAIN LOOP ----------------------------------------------------------------
+
+# Init some stuff for speed selection...
+max_time    = 10.0
+min_time    =  0.1
+time_range  = (max_time - min_time)
+speed_pixel = int(num_leds * (duration - min_time) / time_range)
+duration    = min_time + time_range * speed_pixel / (num_leds - 1)
+
+loop.addReader(buttons, onButtons)
+scandir() # USB drive might already be inserted
+loop.addSignal(signal.SIGUSR1, usbMounted) # USB mount signal
+loop.addSignal(signal.SIGUSR2, usbRemoved) # USB unmount signal
+
+try:
+	loop.run() # Everything happens in the callbacks above
 
 except KeyboardInterrupt:
 	print "Cleaning up"
+	pipeline.stop() # Ends a sweep that's painting
+	buttons.close()
+	if encoder is not None: encoder.close()
 	GPIO.cleanup()
 	strip.clear()
 	strip.show()
 	print "Done!"
-
@@ -39,11 +39,18 @@ import os
 import select
 import signal
 import time
-import RPi.GPIO as GPIO
-from dotstar import Adafruit_DotStar
-from evdev import InputDevice, ecodes
+from buttons import Buttons, PRESS, REPEAT, RELEASE
+from stripbackend import openStrip, loadBitrate, headless
+if headless(): # No Pi: stand-in buttons and mouse (see standins.py)
+	from standins import GPIO, InputDevice, ecodes
+else:
+	import RPi.GPIO as GPIO
+	from evdev import InputDevice, ecodes
 from lightpaint import LightPaint
 from PIL import Image
+from imagecache import ImageCache
+from paintcache import PaintCache
+from scanner import ImageScanner
 
 # CONFIGURABLE STUFF -------------------------------------------------------
 
@@ -59,12 +66,18 @@ vflip      = 'true' # 'true' if strip input at bottom, else 'false'
 # DotStar strip data & clock MUST connect to hardware SPI pins
 # (GPIO 10 & 11).  12000000 (12 MHz) is the SPI clock rate; this is the
 # fastest I could reliably operate a 288-pixel strip without glitching.
-# You can try faster, or may need to set it lower, no telling.
+# You can try faster, or may need to set it lower, no telling; run
+# calibrate.py to find the best rate for your strip, which is then used
+# instead (saved in bitrate_file).
 # If using older (pre-2015) DotStar strips, declare "order='gbr'" above
-# for correct color order.
-strip = Adafruit_DotStar(num_leds, 12000000, order=order)
+# for correct color order.  Set DOTSTAR_BACKEND=memory or file:<path> in
+# the environment to record frames instead (see stripbackend.py); the
+# buttons and mouse are then stand-ins too (see standins.py), so this
+# runs without a Pi.
+bitrate_file = '/var/lib/lightpaint/bitrate'
+strip = openStrip(num_leds, loadBitrate(bitrate_file, 12000000), order=order)
 
-path      = '/media/usb'         # USB stick mount point
+path      = os.environ.get('LIGHTPAINT_USB', '/media/usb') # USB stick mount
 mousefile = '/dev/input/mouse0'  # Mouse device (as positional encoder)
 eventfile = '/dev/input/event0'  # Mouse events accumulate here
 dev       = None                 # None unless mouse is detected
@@ -72,17 +85,22 @@ dev       = None                 # None unless mouse is detected
 gamma          = (2.8, 2.8, 2.8) # Gamma correction curves for R,G,B
 color_balance  = (128, 255, 180) # Max brightness for R,G,B (white balance)
 power_settings = (1450, 1550)    # Battery avg and peak current
+global_brightness = False        # True: power limit with the LEDs' 5-bit
+                                 # brightness field, keeping color depth
+cache_budget   = 32 * 1024 * 1024 # Bytes of loaded images to keep ready
+cache_dir      = os.environ.get('LIGHTPAINT_CACHE',
+                   '/var/cache/lightpaint') # Processed images saved here
+cache_limit    = 256 * 1024 * 1024 # Most disk space they may take
+sweep_frames   = 512             # Columns pre-rendered per image sweep (1+)
 
 # INITIALIZATION -----------------------------------------------------------
 
 # Set control pins to inputs and enable pull-up resistors.
 # Buttons should connect between these pins and ground.
+# Edge callbacks queue debounced press/repeat/release events for them,
+# numbered 1-5 in this order.
 GPIO.setmode(GPIO.BCM)
-GPIO.setup(pin_mode    , GPIO.IN, pull_up_down=GPIO.PUD_UP)
-GPIO.setup(pin_prev  , GPIO.IN, pull_up_down=GPIO.PUD_UP)
-GPIO.setup(pin_next  , GPIO.IN, pull_up_down=GPIO.PUD_UP)
-GPIO.setup(pin_slower, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-GPIO.setup(pin_faster, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+buttons = Buttons(GPIO, [pin_mode, pin_faster, pin_slower, pin_next, pin_prev])
 
 strip.begin() # Initialize SPI pins for output
 
@@ -106,27 +124,22 @@ def sigusr2_handler(signum, frame):
 	global filename
 	filename = None
 	imgNum   = 0
+	imageCache.clear()
 	# Current LightPaint object is left resident
 
-# Scan root folder of USB drive for viable image files.
+# Scan root folder of USB drive for viable image files.  The scanner
+# only reads image headers, several at once, and remembers files it has
+# seen before, so a rescan only opens new or changed ones.
 def scandir():
 	global imgNum, lightpaint, filename
-	files     = os.listdir(path)
-	num_files = len(files) # Total # of files, whether images or not
 	filename  = []         # Filename list of valid images
 	imgNum    = 0
-	if num_files == 0: return
-	for i, f in enumerate(files):
-		lower =  i      * num_leds / num_files
-		upper = (i + 1) * num_leds / num_files
-		for n in range(lower, upper):
-			strip.setPixelColor(n, 0x010100) # Yellow
+	imageCache.clear()     # Files may have changed
+	for f, size in scanner.scan(path):
+		upper = scanner.checked * num_leds / scanner.total
+		strip.fill(0, upper, 0x010100) # Yellow
 		strip.show()
-		if f[0] == '.': continue
-		try:    Image.open(os.path.join(path, f))
-		except: continue   # Is directory or non-image file; skip
 		filename.append(f) # Valid image, add to list
-		time.sleep(0.05)   # Tiny pause so progress bar is visible
 	strip.clear()
 	strip.show()
 	if len(filename) > 0:                  # Found some image files?
@@ -134,42 +147,44 @@ def scandir():
 		lightpaint = loadImage(imgNum) # Load first image
 
 # Load image, do some conversion and processing as needed before painting.
-def loadImage(index):
-	num_images = len(filename)
-	lower      =  index      * num_leds / num_images
-	upper      = (index + 1) * num_leds / num_images
-	for n in range(lower, upper):
-		strip.setPixelColor(n, 0x010000) # Red = loading
-	strip.show()
-	print "Loading '" + filename[index] + "'..."
+# Also runs on the image cache's background thread (to prefetch the next
+# and previous images), so this must not touch the strip.  Returns the
+# LightPaint object and roughly how much memory it holds.
+def processImage(filepath):
+	print "Loading '" + os.path.basename(filepath) + "'..."
 	startTime = time.time()
-	# Load image, convert to RGB if needed
-	img = Image.open(os.path.join(path, filename[index])).convert("RGB")
-	print "\t%dx%d pixels" % img.size
-
-	# If necessary, image is vertically scaled to match LED strip.
-	# Width is NOT resized, this is on purpose.  Pixels need not be
-	# square!  This makes for higher-resolution painting on the X axis.
-	if img.size[1] != num_leds:
-		print "\tResizing...",
-		img = img.resize((img.size[0], num_leds), Image.BICUBIC)
-		print "now %dx%d pixels" % img.size
-
-	# Convert raw RGB pixel data to a string buffer.
-	# The C module can easily work with this format.
-	pixels = img.tostring()
+	# Resized pixels and LightPaint tables may already be on disk from
+	# an earlier run with the same image file and settings.
+	key   = paintCache.key(filepath)
+	entry = paintCache.get(key)
+	if entry:
+		pixels, size, tables = entry
+		print "\t%dx%d pixels (cached)" % size
+	else:
+		img = Image.open(filepath)
+		print "\t%dx%d pixels" % img.size
+
+		# Image is converted to RGB and, if necessary, vertically
+		# scaled to match LED strip, a chunk of columns at a time,
+		# straight into the disk cache (see paintcache.py).  Width is
+		# NOT resized, this is on purpose.  Pixels need not be square!
+		# This makes for higher-resolution painting on the X axis.
+		# Columns are stored in the order the C module reads them,
+		# so it can paint from the file (mapped into memory) as-is.
+		pixels, size = paintCache.convert(key, img, num_leds,
+		  vflip.lower() in ('true', '1'))
+		del img
+		tables = None # Computed by LightPaint
 	print "\t%f seconds" % (time.time() - startTime)
 
 	# Do external C processing on image; this provides 16-bit gamma
 	# correction, diffusion dithering and brightness adjustment to
 	# match power source capabilities.
-	for n in range(lower, upper):
-		strip.setPixelColor(n, 0x010100) # Yellow
-	strip.show()
 	print "Processing..."
 	startTime  = time.time()
 	# Pixel buffer, image size, gamma, color balance and power settings
-	# are REQUIRED arguments.  One or two additional arguments may
+	# are REQUIRED arguments.  "tables" passes the dither tables from the
+	# disk cache (None computes them).  One or two additional arguments may
 	# optionally be specified:  "order='gbr'" changes the DotStar LED
 	# color component order to be compatible with older strips (same
 	# setting needs to be present in the Adafruit_DotStar declaration
@@ -177,29 +192,72 @@ def loadImage(index):
 	# input end of the strip is at the bottom, rather than top (I
 	# prefer having the Pi at the bottom as it provides some weight).
 	# Returns a LightPaint object which is used later for dithering
-	# and display.
-	lightpaint = LightPaint(pixels, img.size, gamma, color_balance,
-	  power_settings, order=order, vflip=vflip)
+	# and display.  "globalBrightness" lets the power limit dim via the
+	# LEDs' own 5-bit brightness field (see lightpaint.c).
+	# "layout='columns'" says the pixels are already by column, as
+	# stored by the cache.
+	lightpaint = LightPaint(pixels, size, gamma, color_balance,
+	  power_settings, order=order, vflip=vflip, tables=tables,
+	  globalBrightness=global_brightness, layout='columns')
 	print "\t%f seconds" % (time.time() - startTime)
+	if tables is None:
+		paintCache.put(key, size, lightpaint.getTables())
+	# LightPaint paints from the mapped file, which counts against the
+	# cache budget like the tables do: evicting the image is what
+	# unmaps the file and closes it, so it has to be evicted sometime.
+	return lightpaint, len(pixels) + size[1] * 3 + 256 * 9
+
+# Processed images on disk, keyed by image file and all settings above
+paintCache = PaintCache(cache_dir, cache_limit, gamma, color_balance,
+  power_settings, num_leds, order, vflip, global_brightness)
+
+# Ready-to-paint images, so next/prev and the slideshow don't stall
+imageCache = ImageCache(processImage, cache_budget)
+
+# Finds the images on the USB drive; see scandir()
+scanner = ImageScanner()
+
+# Get image ready for painting.  Usually this is already done (by the
+# cache's prefetching), else it's loaded now with a progress bar.
+def loadImage(index):
+	num_images = len(filename)
+	filepath   = os.path.join(path, filename[index])
+	lower      =  index      * num_leds / num_images
+	upper      = (index + 1) * num_leds / num_images
+	cached     = filepath in imageCache
+	if not cached:
+		strip.fill(lower, upper, 0x010000) # Red = loading
+		strip.show()
+
+	lightpaint = imageCache.get(filepath)
 
 	# Success!
-	for n in range(lower, upper):
-		strip.setPixelColor(n, 0x000100) # Green
-	strip.show()
-	time.sleep(0.25) # Tiny delay so green 'ready' is visible
+	if not cached:
+		strip.fill(lower, upper, 0x000100) # Green
+		strip.show()
+		time.sleep(0.25) # Tiny delay so green 'ready' is visible
+		strip.clear()
+		strip.show()
 	print "Ready!"
 
-	strip.clear()
-	strip.show()
+	# Start getting the neighboring images ready in the background
+	imageCache.prefetch([
+	  os.path.join(path, filename[(index + 1) % num_images]),
+	  os.path.join(path, filename[index - 1])])
 	return lightpaint
 
-def btn():
-	if not GPIO.input(pin_mode):   return 1
-	if not GPIO.input(pin_faster): return 2
-	if not GPIO.input(pin_slower): return 3
-	if not GPIO.input(pin_next):   return 4
-	if not GPIO.input(pin_prev):   return 5
-	return 0
+# Dither a whole sweep of the image ahead of time into strip-ready frames
+# (sweep_frames columns across the image), so the fast paint loop only has
+# to pick a frame by elapsed time and show it.  Kept until the image changes.
+frameSize = num_leds * 4 # Bytes per strip-ready frame
+sweep     = None
+sweepFor  = None         # LightPaint object the sweep was rendered from
+def renderSweep(lightpaint):
+	global sweep, sweepFor
+	if sweepFor is not lightpaint:
+		sweep    = memoryview(lightpaint.renderSweep(sweep_frames))
+		sweepFor = lightpaint
+	return sweep
 
 # MAIN LOOP ----------------------------------------------------------------
 
@@ -209,8 +267,6 @@ min_time    =  0.02 # a good time is around .04
 time_range  = (max_time - min_time)
 speed_pixel = int(num_leds * (duration - min_time) / time_range) 
 duration    = min_time + time_range * speed_pixel / (num_leds - 1) #sweep duration in seconds
-prev_btn    = 0
-rep_time    = 0.2
 slideShowTime = 4 # time to show each image when in slideShow mode
 slideStartTime = time.time()
 
@@ -220,61 +276,48 @@ signal.signal(signal.SIGUSR2, sigusr2_handler) # USB unmount signal
 
 try:
 	while True:
-		#check for button pushes
-		b = btn()
-		if b == 1:
-			# mode change from show one image to slideshow 
-                        slideShow = not slideShow
-                        time.sleep(0.2) #debounce
-		elif b == 2:
-			# Decrease paint duration
-			if speed_pixel > 0:
-				speed_pixel -= 1
-				duration = (min_time + time_range *
-				  speed_pixel / (num_leds - 1))
-			strip.setPixelColor(speed_pixel, 0x000080)
-			strip.show()
-			startTime = time.time()
-			while (btn() == 2 and ((time.time() - startTime) <
-			  rep_time)): continue
-			strip.clear()
-			strip.show()
-                        print "show duration: %f seconds" % (duration)
-		elif b == 3:
-			# Increase paint duration (up to 10 sec maximum)
-			if speed_pixel < num_leds - 1:
-				speed_pixel += 1
-				duration = (min_time + time_range *
-				  speed_pixel / (num_leds - 1))
-			strip.setPixelColor(speed_pixel, 0x000080)
-			strip.show()
-			startTime = time.time()
-			while (btn() == 3 and ((time.time() - startTime) <
-			  rep_time)): continue
-			strip.clear()
-			strip.show()
-                        print "show duration: %f seconds" % (duration)
-		elif b == 4 and filename != None:
-			# Next image (if USB drive present)
-			imgNum += 1
-			if imgNum >= len(filename): imgNum = 0
-			lightpaint = loadImage(imgNum)
-			while btn() == 4: continue
-		elif b == 5 and filename != None:
-			# Previous image (if USB drive present)
-			imgNum -= 1
-			if imgNum < 0: imgNum = len(filename) - 1
-			lightpaint = loadImage(imgNum)
-			while btn() == 5: continue
-		#handle button hold down
-		if b > 0 and b == prev_btn:
-			# If button held, accelerate speed selection
-			rep_time *= 0.92
-			if rep_time < 0.01: rep_time = 0.01
-			continue #skip drawing while button held down
-		else:
-			rep_time = 0.2
-		prev_btn = b
+		#handle button events; queued as they happen, this is just a flag check when there are none
+		for kind, b in buttons.events():
+			if b == 1 and kind == PRESS:
+				# mode change from show one image to slideshow
+				slideShow = not slideShow
+			elif b == 2 and kind in (PRESS, REPEAT):
+				# Decrease paint duration (repeats, faster
+				# and faster, while the button is held)
+				if speed_pixel > 0:
+					speed_pixel -= 1
+					duration = (min_time + time_range *
+					  speed_pixel / (num_leds - 1))
+				strip.clear()
+				strip.setPixelColor(speed_pixel, 0x000080)
+				strip.show()
+				print "show duration: %f seconds" % (duration)
+			elif b == 3 and kind in (PRESS, REPEAT):
+				# Increase paint duration (up to 10 sec maximum)
+				if speed_pixel < num_leds - 1:
+					speed_pixel += 1
+					duration = (min_time + time_range *
+					  speed_pixel / (num_leds - 1))
+				strip.clear()
+				strip.setPixelColor(speed_pixel, 0x000080)
+				strip.show()
+				print "show duration: %f seconds" % (duration)
+			elif (b == 2 or b == 3) and kind == RELEASE:
+				strip.clear()
+				strip.show()
+			elif b == 4 and kind == PRESS and filename != None:
+				# Next image (if USB drive present)
+				imgNum += 1
+				if imgNum >= len(filename): imgNum = 0
+				lightpaint = loadImage(imgNum)
+			elif b == 5 and kind == PRESS and filename != None:
+				# Previous image (if USB drive present)
+				imgNum -= 1
+				if imgNum < 0: imgNum = len(filename) - 1
+				lightpaint = loadImage(imgNum)
+		if buttons.isDown(2) or buttons.isDown(3):
+			buttons.wait() #skip drawing while speed is being set, sleeping till the next step
+			continue
 
 		if lightpaint != None:
 			# Paint!
@@ -284,23 +327,28 @@ try:
 			        if imgNum >= len(filename): imgNum = 0
 			        lightpaint = loadImage(imgNum)
                                 slideStartTime = time.time()
+                        frames    = renderSweep(lightpaint)
+                        numFrames = len(frames) / frameSize
                         startTime = time.time()
 			while True:
 				t1        = time.time()
 				elapsed   = t1 - startTime
 				if elapsed > duration: break
-				# dither() function is passed a
-				# destination buffer and a float
-				# from 0.0 to 1.0 indicating which
-				# column of the source image to
-				# render.  Interpolation happens.
-				lightpaint.dither(ledBuf,
-				  elapsed / duration)
-				strip.show(ledBuf)
+				# Columns were dithered ahead of time
+				# (see renderSweep()), so just pick
+				# the one for this point in the sweep.
+				# showAsync() queues it and returns, so
+				# the next one is picked during the SPI
+				# transfer (show() waits for the queue).
+				n = int(elapsed / duration * (numFrames - 1))
+				strip.showAsync(frames[n * frameSize:(n + 1) * frameSize])
+		else:
+			buttons.wait() # Nothing to show, sleep until a button (or USB signal)
 
 
 except KeyboardInterrupt:
 	print "Cleaning up"
+	buttons.close()
 	GPIO.cleanup()
 	strip.clear()
 	strip.show()
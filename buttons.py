@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Interrupt-driven pushbuttons: a debounced queue of press/hold/repeat/release events
+
+Polling five GPIO.input()s on every loop pass, and spinning on them while a button is held, costs a whole
+core.  Instead each pin gets an edge callback (RPi.GPIO's add_event_detect), which only notes that the pin
+changed; a timer thread re-reads it once the contacts have settled ('bounce' seconds later) and queues the
+real transitions.  While a button is down the same thread queues a HOLD after 'holdTime', and REPEATs
+that start 'repeatTime' after the press and speed up (x 'accel' each, down to 'repeatMin') like the
+scripts' old speed selection.  With no button down it waits on a condition, so idle costs nothing.
+
+Buttons are numbered from 1 in the order their pins are given, like the old btn().  Events are
+(kind, button) tuples.  'pending' is a plain attribute, set whenever there are events waiting, so a render
+loop can check it every frame for the cost of an attribute read; events() returns right away when it's
+not set.  A loop with nothing else to do sleeps in wait(), or selects on fileno() along with other files.
+
+Usage:
+    buttons = Buttons(GPIO, [pin_go, pin_faster, pin_slower, pin_next, pin_prev])
+    while True:
+        buttons.wait()                  #sleeps until something happens
+        for kind, b in buttons.events():
+            if kind == PRESS and b == 1: ...
+"""
+
+import errno
+import fcntl
+import os
+import select
+import threading
+from collections import deque
+from frameclock import monotonic
+
+PRESS   = 'press'
+HOLD    = 'hold'
+REPEAT  = 'repeat'
+RELEASE = 'release'
+
+
+class Buttons():
+    """
+    Debounced events from pushbuttons wired between 'pins' and ground
+    'gpio' is the RPi.GPIO module (already setmode()'d); the pins are set up as pulled-up inputs here
+    """
+    def __init__(self, gpio, pins, bounce=0.02, holdTime=0.5, repeatTime=0.2, repeatMin=0.01, accel=0.92):
+        self.gpio = gpio
+        self.pins = list(pins)
+        self.bounce = bounce
+        self.holdTime = holdTime
+        self.repeatTime = repeatTime
+        self.repeatMin = repeatMin
+        self.accel = accel
+        n = len(self.pins)
+        self.down = [False] * n         #debounced state, read without locking
+        self.settle = [None] * n        #when to re-read a pin that changed
+        self.pressTime = [0.0] * n
+        self.held = [False] * n
+        self.nextRepeat = [0.0] * n
+        self.interval = [repeatTime] * n
+        self.queue = deque()
+        self.pending = False
+        self.readFd, self.writeFd = os.pipe()   #wakes up wait() or a caller's select()
+        for fd in (self.readFd, self.writeFd):
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+        self.cond = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+        for pin in self.pins:
+            gpio.setup(pin, gpio.IN, pull_up_down=gpio.PUD_UP)
+            gpio.add_event_detect(pin, gpio.BOTH, callback=self._edge)
+
+    def close(self):
+        for pin in self.pins:
+            self.gpio.remove_event_detect(pin)
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.thread.join()
+        os.close(self.readFd)
+        os.close(self.writeFd)
+
+    def fileno(self):
+        return self.readFd
+
+    def isDown(self, button):
+        return self.down[button - 1]
+
+    def anyDown(self):
+        return True in self.down
+
+    def get(self):
+        """
+        Next (kind, button) event, or None if there isn't one
+        """
+        try:
+            return self.queue.popleft()
+        except IndexError:
+            pass
+        self.pending = False
+        try:
+            while os.read(self.readFd, 64): pass
+        except OSError:
+            pass
+        if self.queue:      #queued between popleft() and clearing 'pending'
+            self.pending = True
+            return self.queue.popleft()
+        return None
+
+    def events(self):
+        """
+        Yield the events waiting, without blocking
+        """
+        while self.pending:
+            event = self.get()
+            if event is None: return
+            yield event
+
+    def wait(self, timeout=None):
+        """
+        Sleep until there are events (True) or 'timeout' seconds pass (False)
+        A signal also ends the wait early, so the caller can look at whatever its handler changed
+        """
+        if self.pending: return True
+        try:
+            select.select([self.readFd], [], [], timeout)
+        except (select.error, OSError) as e:
+            if e.args[0] != errno.EINTR: raise
+        return self.pending
+
+    def _put(self, kind, i):
+        self.queue.append((kind, i + 1))
+        if not self.pending:
+            self.pending = True
+            try:
+                os.write(self.writeFd, b'x')
+            except OSError:
+                pass    #pipe full: wait() will see 'pending' anyway
+
+    def _edge(self, pin):
+        #called on RPi.GPIO's thread for every edge, bounces included; just have the pin looked at later
+        with self.cond:
+            self.settle[self.pins.index(pin)] = monotonic() + self.bounce
+            self.cond.notify()
+
+    def _run(self):
+        with self.cond:
+            while self.running:
+                now = monotonic()
+                deadlines = []
+                for i in range(len(self.pins)):
+                    if self.settle[i] is not None:
+                        if now < self.settle[i]:
+                            deadlines.append(self.settle[i])
+                            continue
+                        self.settle[i] = None
+                        self._update(i, now)
+                    if not self.down[i]: continue
+                    if not self.held[i] and now >= self.pressTime[i] + self.holdTime:
+                        self.held[i] = True
+                        self._put(HOLD, i)
+                    if now >= self.nextRepeat[i]:
+                        self._update(i, now)    #in case an edge was missed, don't repeat a released button
+                        if not self.down[i]: continue
+                        self._put(REPEAT, i)
+                        self.interval[i] = max(self.interval[i] * self.accel, self.repeatMin)
+                        self.nextRepeat[i] = now + self.interval[i]
+                    deadlines.append(self.nextRepeat[i])
+                    if not self.held[i]: deadlines.append(self.pressTime[i] + self.holdTime)
+                if deadlines:
+                    self.cond.wait(max(min(deadlines) - monotonic(), 0))
+                else:
+                    self.cond.wait()
+
+    def _update(self, i, now):
+        down = not self.gpio.input(self.pins[i])
+        if down == self.down[i]: return
+        self.down[i] = down
+        if down:
+            self.pressTime[i] = now
+            self.held[i] = False
+            self.interval[i] = self.repeatTime
+            self.nextRepeat[i] = now + self.repeatTime
+            self._put(PRESS, i)
+        else:
+            self._put(RELEASE, i)
@@ -0,0 +1,65 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Find the fastest SPI bitrate the attached DotStar strip runs cleanly at
+
+There's no way to read data back from the strip, so this needs someone watching it.  For each bitrate,
+slowest first, a test pattern is sent over and over for a few seconds; answer whether it looked right.
+Bad data shows up as flicker, wrong colors or LEDs past some point not lighting.  The first 'no' stops
+the test, and the last good rate (one step down, to leave some margin) is saved for the painter scripts,
+which read it with stripbackend.loadBitrate().
+
+Usage: sudo python calibrate.py [num_leds] [order]
+"""
+
+import sys
+import time
+from stripbackend import openStrip, saveBitrate
+
+num_leds     = int(sys.argv[1]) if len(sys.argv) > 1 else 144
+order        = sys.argv[2] if len(sys.argv) > 2 else 'brg'
+bitrate_file = '/var/lib/lightpaint/bitrate' # Where the scripts look for it
+rates        = [4000000, 6000000, 8000000, 10000000, 12000000, 16000000,
+                20000000, 24000000, 32000000]
+test_time    = 3.0  # Seconds each rate is shown for
+
+try:
+    ask = raw_input
+except NameError:
+    ask = input
+
+# Dim red-to-green ramp with a blue tick every 8th LED, so any wrong bit shows as a visible glitch, and a
+# bright blue last LED (if it's missing or another color, data got lost along the strip)
+pattern = bytearray()
+for i in range(num_leds):
+    r = 32 * i // num_leds
+    pattern += bytearray((r, 32 - r, 16 if i % 8 == 0 else 0))
+pattern[-3:] = bytearray((0, 0, 255))
+
+strip = openStrip(num_leds, rates[0], order=order)
+strip.begin()
+strip.setPixels(0, pattern)
+
+good = None
+try:
+    for rate in rates:
+        strip.setBitrate(rate)
+        print ("%5.1f MHz..." % (rate / 1e6))
+        endTime = time.time() + test_time
+        while time.time() < endTime:
+            strip.show()
+        answer = ask("Clean pattern, last LED bright blue? [y/n] ").strip().lower()
+        if not answer.startswith('y'): break
+        good = rate
+except KeyboardInterrupt:
+    print ("")
+
+strip.clear()
+strip.show()
+
+if good is None:
+    print ("No good bitrate found, nothing saved (check wiring, level shifter and power)")
+else:
+    safe = rates[max(rates.index(good) - 1, 0)]
+    saveBitrate(bitrate_file, safe)
+    print ("Fastest clean rate %.1f MHz, saved %.1f MHz to %s" % (good / 1e6, safe / 1e6, bitrate_file))
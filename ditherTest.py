@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Speed of LightPaint.dither() vs image width, for one or more builds of the lightpaint module
+
+Needs the lightpaint module built (make); no strip or Pi needed.
+Sweeps across each test image the way the painter does, and reports dithered columns per second for each
+lightpaint.so named on the command line (default: the one here), side by side.  To compare with an older
+build, make it somewhere else and pass both, eg:
+    mkdir /tmp/old && git show <commit>:lightpaint.c > /tmp/old/lightpaint.c
+    make -C /tmp/old -f $PWD/Makefile lightpaint.so
+    python ditherTest.py /tmp/old/lightpaint.so ./lightpaint.so
+Pixels are passed row-major (what every build accepts) and vflip is off: builds before column-major
+storage only flip correctly on 32 bit, so this keeps the comparison fair on a desktop.
+"""
+
+import imp
+import os
+import sys
+import time
+
+numLEDs = 144
+numCols = 20000     #dither() calls per test
+widths = [100, 1000, 5000, 20000]
+
+
+def loadBuild(path):
+    #each .so is its own module object, even with the same module name, so several can be loaded at once
+    return imp.load_dynamic('lightpaint', os.path.abspath(path))
+
+
+def columnsPerSec(lightpaintModule, pixels, width):
+    lightpaint = lightpaintModule.LightPaint(pixels, (width, numLEDs), (2.8, 2.8, 2.8),
+      (128, 255, 180), (1450, 1550), order='bgr', vflip='false')
+    ledBuf = bytearray(numLEDs * 4)
+    startTime = time.time()
+    for i in range(numCols):
+        lightpaint.dither(ledBuf, float(i) / (numCols - 1))
+    return numCols / (time.time() - startTime)
+
+
+paths = sys.argv[1:] or [os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lightpaint.so')]
+builds = [loadBuild(path) for path in paths]
+for i, path in enumerate(paths):
+    print ("build %d: %s" % (i + 1, path))
+print ("columns wide" + "".join("   build %d col/s" % (i + 1) for i in range(len(builds))))
+for width in widths:
+    pixels = os.urandom(width * numLEDs * 3)
+    print ("%12d" % width + "".join("%16.0f" % columnsPerSec(build, pixels, width) for build in builds))
+
+
+#learnings:
+# on a desktop x86, python 2.7, 144 LEDs; build 1 is the last row-major build, build 2 column-major:
+#  columns wide   build 1 col/s   build 2 col/s
+#           100          219356          224103
+#          1000          220865          221575
+#          5000          219507          216094
+#         20000          200513          209576
+# most of the time is the python call itself, so it's about even until the image outgrows the cache;
+# the difference should be bigger on a Pi's small cache
@@ -10,8 +10,8 @@
   be...for example, RGB colors might be more elegantly expressed as
   tuples or something other than the packed 32-bit integers used here.
   Also, it does not have 100% feature parity with that library...e.g.
-  getPixels() is missing here, and this code allows changing the SPI
-  bitrate (Arduino lib does not).
+  this code allows changing the SPI bitrate (Arduino lib does not), and
+  adds bulk setPixels() and fill() calls.
 
   There's no doc strings yet.
 
@@ -59,6 +59,8 @@
 #include <sys/mman.h>
 #include <sys/ioctl.h>
 #include <linux/spi/spidev.h>
+#include <pthread.h>
+#include <time.h>
 
 // From GPIO example code by Dom and Gert van Loo on elinux.org:
 #define PI1_BCM2708_PERI_BASE 0x20000000
@@ -72,6 +74,16 @@
 #define SPI_MOSI_PIN 10
 #define SPI_CLK_PIN  11
 
+#define QUEUE_SIZE 4 // Frames showAsync() can have waiting or in transfer
+
+// spidev rejects any one SPI_IOC_MESSAGE longer than its 'bufsiz' module
+// parameter (4096 bytes unless changed), which a 1024+ LED strip exceeds.
+// begin() reads the actual limit from here; raw_send() splits to fit.
+#define SPIDEV_BUFSIZ_FILE "/sys/module/spidev/parameters/bufsiz"
+#define SPIDEV_BUFSIZ      4096
+
+#define REFRESH 1.0 // Default seconds before an unchanged frame is resent
+
 static volatile unsigned
   *gpio = NULL, // Memory-mapped GPIO peripheral
   *gpioSet,     // Write bitmask of GPIO pins to set here
@@ -105,7 +117,8 @@ typedef struct {             // Python object for DotStar strip
 	uint32_t numLEDs,    // Number of pixels in strip
 	         dataMask,   // Data pin bitmask if using bitbang SPI
 	         clockMask,  // Clock pin bitmask if bitbang SPI
-	         bitrate;    // SPI clock speed if using hardware SPI
+	         bitrate,    // SPI clock speed if using hardware SPI
+	         bufsiz;     // Max bytes per spidev transfer message
 	int      fd;         // File descriptor if using hardware SPI
 	uint8_t *pixels,     // -> pixel data
 	        *pBuf,       // -> temp buf for brightness-scaling w/SPI
@@ -115,6 +128,29 @@ typedef struct {             // Python object for DotStar strip
 	         rOffset,    // Index of red in 4-byte pixel
 	         gOffset,    // Index of green byte
 	         bOffset;    // Index of blue byte
+	// showAsync() frame queue, drained by a writer thread.  Everything
+	// below is guarded by 'lock' once the writer has been started.
+	pthread_t       writer;
+	pthread_mutex_t lock;
+	pthread_cond_t  cond;      // Signalled when a frame is queued or sent
+	uint8_t        *queue[QUEUE_SIZE]; // Ring of preallocated frames
+	uint32_t        queueLen[QUEUE_SIZE], // Bytes in each queued frame
+	                slotSize,  // Bytes allocated per frame
+	                head,      // Next slot to fill
+	                queued,    // Frames waiting or being sent
+	                underruns, // Frames that found the strip idle
+	                sent;      // Frames sent by the writer
+	uint8_t         running,   // Writer thread started
+	                streaming; // Frames queued since the last wait()
+	// Skipping of frames identical to the last one sent (see raw_write())
+	uint8_t        *lastFrame; // Copy of last frame sent
+	uint32_t        lastLen,   // Its length (0 = none, always send)
+	                lastSize,  // Bytes allocated for lastFrame
+	                transmitted, // Frames actually sent to the strip
+	                skipped;   // Frames skipped as repeats
+	double          lastTime,  // When lastFrame was sent
+	                refresh;   // Resend unchanged frame after this long
+	uint8_t         skipRepeats; // Skipping enabled
 } DotStarObject;
 
 // Allocate new DotStar object.  There's a few ways this can be called:
@@ -173,6 +209,7 @@ static PyObject *DotStar_new(
 			self->dataMask   = 0;
 			self->clockMask  = 0;
 			self->bitrate    = bitrate;
+			self->bufsiz     = SPIDEV_BUFSIZ;
 			self->fd         = -1;
 			self->pixels     = pixels; // NULL if 0 pixels
 			self->pBuf       = NULL;   // alloc'd on 1st use
@@ -182,6 +219,24 @@ static PyObject *DotStar_new(
 			self->rOffset    = rOffset;
 			self->gOffset    = gOffset;
 			self->bOffset    = bOffset;
+			memset(self->queue, 0, sizeof(self->queue));
+			self->slotSize   = 0;
+			self->head       = 0;
+			self->queued     = 0;
+			self->underruns  = 0;
+			self->sent       = 0;
+			self->running    = 0;
+			self->streaming  = 0;
+			self->lastFrame  = NULL;
+			self->lastLen    = 0;
+			self->lastSize   = 0;
+			self->transmitted = 0;
+			self->skipped    = 0;
+			self->lastTime   = 0.0;
+			self->refresh    = REFRESH;
+			self->skipRepeats = 1;
+			pthread_mutex_init(&self->lock, NULL);
+			pthread_cond_init(&self->cond, NULL);
 			Py_INCREF(self);
 		} else if(pixels) {
 			free(pixels);
@@ -256,6 +311,7 @@ static int boardType(void) {
 
 // Initialize pins/SPI for output
 static PyObject *begin(DotStarObject *self) {
+	self->lastLen = 0; // Strip state unknown, first frame always goes out
 	if(self->dataPin == 0xFF) { // Use hardware SPI
 		if((self->fd = open("/dev/spidev0.0", O_RDWR)) < 0) {
 			printf("Can't open /dev/spidev0.0 (try 'sudo')\n");
@@ -268,7 +324,13 @@ static PyObject *begin(DotStarObject *self) {
 		// frequency and the smallest power-of-two prescaler
 		// that will not exceed the requested rate.
 		// e.g. 8 MHz request: 250 MHz / 32 = 7.8125 MHz.
-		ioctl(self->fd, SPI_IOC_WR_MAX_SPEED_HZ, self->bitrate);
+		ioctl(self->fd, SPI_IOC_WR_MAX_SPEED_HZ, &self->bitrate);
+		FILE *fp;
+		if((fp = fopen(SPIDEV_BUFSIZ_FILE, "r"))) {
+			if((fscanf(fp, "%u", &self->bufsiz) != 1) ||
+			   (self->bufsiz < 16)) self->bufsiz = SPIDEV_BUFSIZ;
+			fclose(fp);
+		}
 	} else { // Use bitbang "soft" SPI (any 2 pins)
 		if(gpio == NULL) { // First time accessing GPIO?
 			int fd;
@@ -341,6 +403,28 @@ static PyObject *setBrightness(DotStarObject *self, PyObject *arg) {
 	return Py_None;
 }
 
+// Set the DotStars' own 5-bit global brightness, 0 (off) to 31 (full, the
+// default), by writing the header byte of every pixel (0xE0 + level).
+// Unlike setBrightness() this costs nothing per show() and reduces LED
+// current without losing 8-bit color resolution; the two can be combined.
+// Applies to the object's pixel buffer; buffers passed to show() carry
+// their own header bytes (see LightPaint's 'globalBrightness' keyword).
+static PyObject *setGlobalBrightness(DotStarObject *self, PyObject *arg) {
+	uint8_t  level;
+	uint32_t i;
+	if(!PyArg_ParseTuple(arg, "b", &level)) return NULL;
+	if(level > 31) level = 31;
+	for(i=0; i<self->numLEDs; i++) self->pixels[i * 4] = 0xE0 | level;
+	Py_INCREF(Py_None);
+	return Py_None;
+}
+
+// Return the 5-bit global brightness (from the first pixel's header)
+static PyObject *getGlobalBrightness(DotStarObject *self) {
+	return Py_BuildValue("b",
+	  self->numLEDs ? (self->pixels[0] & 0x1F) : 31);
+}
+
 // Valid syntaxes:
 // x.setPixelColor(index, red, green, blue)
 // x.setPixelColor(index, 0x00RRGGBB)
@@ -375,6 +459,94 @@ static PyObject *setPixelColor(DotStarObject *self, PyObject *arg) {
 	return Py_None;
 }
 
+// Set a run of pixels from one buffer in a single call.  Valid syntaxes:
+// x.setPixels(start, rgb)     bytes/bytearray/uint8 array of R,G,B triples
+// x.setPixels(start, packed)  uint32 array (e.g. NumPy) of 0x00RRGGBB
+// Which one is decided by the object's 'itemsize' (4 = packed), as the
+// Python 2 array module doesn't give buffer format info.  Pixels past the
+// end of the strip are ignored.
+static PyObject *setPixels(DotStarObject *self, PyObject *arg) {
+	uint32_t  start, i, n;
+	Py_buffer buf;
+	PyObject *obj, *itemsize;
+	int       packed = 0;
+	uint8_t  *ptr;
+
+	if(!PyArg_ParseTuple(arg, "IO", &start, &obj)) return NULL;
+	if((itemsize = PyObject_GetAttrString(obj, "itemsize"))) {
+		packed = (PyInt_AsLong(itemsize) == 4);
+		Py_DECREF(itemsize);
+	} else {
+		PyErr_Clear();
+	}
+	if(PyObject_GetBuffer(obj, &buf, PyBUF_SIMPLE) < 0) {
+		// Py2 array.array only has the old buffer interface
+		PyErr_Clear();
+		if(!PyArg_ParseTuple(arg, "Is*", &start, &buf)) return NULL;
+	}
+
+	n = packed ? (buf.len / 4) : (buf.len / 3);
+	if(start >= self->numLEDs) n = 0;
+	else if(n > self->numLEDs - start) n = self->numLEDs - start;
+	ptr = &self->pixels[start * 4];
+	if(packed) {
+		uint32_t *src = (uint32_t *)buf.buf, v;
+		for(i=0; i<n; i++, ptr += 4) {
+			v = src[i];
+			ptr[self->rOffset] = v >> 16;
+			ptr[self->gOffset] = v >>  8;
+			ptr[self->bOffset] = v;
+		}
+	} else {
+		uint8_t *src = (uint8_t *)buf.buf;
+		for(i=0; i<n; i++, ptr += 4, src += 3) {
+			ptr[self->rOffset] = src[0];
+			ptr[self->gOffset] = src[1];
+			ptr[self->bOffset] = src[2];
+		}
+	}
+	PyBuffer_Release(&buf);
+
+	Py_INCREF(Py_None);
+	return Py_None;
+}
+
+// Set pixels start to end-1 to one color.  Valid syntaxes:
+// x.fill(start, end, red, green, blue)
+// x.fill(start, end, 0x00RRGGBB)
+static PyObject *fill(DotStarObject *self, PyObject *arg) {
+	uint32_t start, end, v;
+	uint8_t  r, g, b, *ptr;
+
+	switch(PyTuple_Size(arg)) {
+	   case 5: // Start, end, r, g, b
+		if(!PyArg_ParseTuple(arg, "IIbbb", &start, &end, &r, &g, &b))
+			return NULL;
+		break;
+	   case 3: // Start, end, value
+		if(!PyArg_ParseTuple(arg, "III", &start, &end, &v))
+			return NULL;
+		r = v >> 16;
+		g = v >>  8;
+		b = v;
+		break;
+	   default:
+		PyErr_SetString(PyExc_TypeError,
+		  "fill(start, end, color) or fill(start, end, r, g, b)");
+		return NULL;
+	}
+
+	if(end > self->numLEDs) end = self->numLEDs;
+	for(ptr = &self->pixels[start * 4]; start < end; start++, ptr += 4) {
+		ptr[self->rOffset] = r;
+		ptr[self->gOffset] = g;
+		ptr[self->bOffset] = b;
+	}
+
+	Py_INCREF(Py_None);
+	return Py_None;
+}
+
 // Bitbang requires throttle on clock set/clear to avoid outpacing strip
 static void clockPulse(uint32_t mask) {
 	volatile uint8_t hi, lo;
@@ -391,20 +563,58 @@ static void clockPulse(uint32_t mask) {
 	while(lo--);
 }
 
-// Private method.  Writes pixel data without brightness scaling.
-static void raw_write(DotStarObject *self, uint8_t *ptr, uint32_t len) {
+// Seconds on a monotonic clock
+static double now(void) {
+	struct timespec t;
+	clock_gettime(CLOCK_MONOTONIC, &t);
+	return t.tv_sec + t.tv_nsec * 1e-9;
+}
+
+// Private method.  Sends pixel data to the strip, no brightness scaling.
+static void raw_send(DotStarObject *self, uint8_t *ptr, uint32_t len) {
 	if(self->fd >= 0) { // Hardware SPI
-		xfer[0].speed_hz = self->bitrate;
-		xfer[1].speed_hz = self->bitrate;
-		xfer[2].speed_hz = self->bitrate;
-		xfer[1].tx_buf   = (unsigned long)ptr;
-		xfer[1].len      = len;
-		if(self->numLEDs) xfer[2].len = (self->numLEDs + 15) / 16;
-		else              xfer[2].len = ((len / 4) + 15) / 16;
+		// Work on a copy of the transfer setup, as another thread
+		// may be in here at the same time for a different strip.
+		struct spi_ioc_transfer x[3];
+		uint32_t footerLen, room, chunk, n, done = 0;
+		if(self->numLEDs) footerLen = (self->numLEDs + 15) / 16;
+		else              footerLen = ((len / 4) + 15) / 16;
+		if(footerLen > self->bufsiz) footerLen = self->bufsiz;
 		// All that spi_ioc_transfer struct stuff earlier in
-		// the code is so we can use this single ioctl to concat
-		// the data & footer into one operation:
-		(void)ioctl(self->fd, SPI_IOC_MESSAGE(3), xfer);
+		// the code is so we can use a single ioctl to concat the
+		// header, data & footer into one operation.  If that's
+		// more than spidev takes at once, the data is split over
+		// several ioctls (header goes with the first, footer with
+		// the last); the strip doesn't mind the clock pausing.
+		memcpy(x, xfer, sizeof(x));
+		x[0].speed_hz = self->bitrate;
+		x[1].speed_hz = self->bitrate;
+		x[2].speed_hz = self->bitrate;
+		n             = 1; // Header goes first
+		room          = self->bufsiz - 4;
+		while(!done) {
+			chunk = (len < room) ? len : room;
+			if(chunk) {
+				memcpy(&x[n], &xfer[1], sizeof(x[n]));
+				x[n].speed_hz = self->bitrate;
+				x[n].tx_buf   = (unsigned long)ptr;
+				x[n].len      = chunk;
+				ptr  += chunk;
+				len  -= chunk;
+				room -= chunk;
+				n++;
+			}
+			if(!len && (footerLen <= room)) {
+				memcpy(&x[n], &xfer[2], sizeof(x[n]));
+				x[n].speed_hz = self->bitrate;
+				x[n].len      = footerLen;
+				n++;
+				done = 1;
+			}
+			(void)ioctl(self->fd, SPI_IOC_MESSAGE(n), x);
+			n    = 0;
+			room = self->bufsiz;
+		}
 	} else if(self->dataMask) { // Bitbang
 		unsigned char byte, bit,
 		              headerLen = 32;
@@ -426,17 +636,96 @@ static void raw_write(DotStarObject *self, uint8_t *ptr, uint32_t len) {
 	}
 }
 
+// Private method.  Writes pixel data without brightness scaling.
+// Called with the GIL released, so it must not touch any Python objects.
+// DotStars have no partial update, but a frame identical to the last one
+// sent needn't go out at all (e.g. a static or black strip), so it's
+// skipped...unless 'refresh' seconds have passed, so a strip that got
+// glitched or power cycled still catches up.
+static void raw_write(DotStarObject *self, uint8_t *ptr, uint32_t len) {
+	double t = 0.0;
+	if(self->skipRepeats) {
+		t = now();
+		if(self->lastLen && (len == self->lastLen) &&
+		   !memcmp(ptr, self->lastFrame, len) &&
+		   ((self->refresh <= 0.0) ||
+		    (t - self->lastTime < self->refresh))) {
+			self->skipped++;
+			return;
+		}
+	}
+	raw_send(self, ptr, len);
+	self->transmitted++;
+	if(self->skipRepeats) { // Keep a copy to compare the next frame to
+		if(len > self->lastSize) {
+			free(self->lastFrame);
+			self->lastSize = 0;
+			if((self->lastFrame = (uint8_t *)malloc(len)))
+				self->lastSize = len;
+		}
+		if(self->lastFrame) {
+			memcpy(self->lastFrame, ptr, len);
+			self->lastLen  = len;
+			self->lastTime = t;
+		} else {
+			self->lastLen  = 0;
+		}
+	}
+}
+
+// Writer thread for showAsync(): sends queued frames oldest first.  A
+// frame's slot stays counted in 'queued' until its transfer completes,
+// so it can't be refilled while still going out.
+static void *writerThread(void *arg) {
+	DotStarObject *self = (DotStarObject *)arg;
+	uint32_t       tail = 0;
+
+	pthread_mutex_lock(&self->lock);
+	for(;;) {
+		while(self->running && !self->queued)
+			pthread_cond_wait(&self->cond, &self->lock);
+		if(!self->running) break;
+		pthread_mutex_unlock(&self->lock);
+		raw_write(self, self->queue[tail], self->queueLen[tail]);
+		pthread_mutex_lock(&self->lock);
+		if(++tail >= QUEUE_SIZE) tail = 0;
+		self->queued--;
+		self->sent++;
+		pthread_cond_broadcast(&self->cond);
+	}
+	pthread_mutex_unlock(&self->lock);
+	return NULL;
+}
+
+// Private method: wait (GIL released) until all queued frames are sent.
+static void drain(DotStarObject *self) {
+	if(!self->running) return;
+	Py_BEGIN_ALLOW_THREADS
+	pthread_mutex_lock(&self->lock);
+	while(self->queued) pthread_cond_wait(&self->cond, &self->lock);
+	self->streaming = 0;
+	pthread_mutex_unlock(&self->lock);
+	Py_END_ALLOW_THREADS
+}
+
 // Issue data to strip.  Optional arg = raw bytearray to issue to strip
 // (else object's pixel buffer is used).  If passing raw data, it must
 // be in strip-ready format (4 bytes/pixel, 0xFF/B/G/R) and no brightness
 // scaling is performed...it's all about speed (for POV, etc.)
+// The GIL is released for the transfer, so other Python threads (e.g.
+// one rendering the next column) keep running while data goes out.
+// Don't modify the buffer being shown from another thread meanwhile.
 static PyObject *show(DotStarObject *self, PyObject *arg) {
+	drain(self); // Frames from showAsync() go out first
 	if(PyTuple_Size(arg) == 1) { // Raw bytearray passed
 		Py_buffer buf;
 		if(!PyArg_ParseTuple(arg, "s*", &buf)) return NULL;
+		Py_BEGIN_ALLOW_THREADS
 		raw_write(self, buf.buf, buf.len);
+		Py_END_ALLOW_THREADS
 		PyBuffer_Release(&buf);
 	} else { // Write object's pixel buffer
+		Py_BEGIN_ALLOW_THREADS
 		if(self->brightness == 0) { // Send raw (no scaling)
 			raw_write(self, self->pixels, self->numLEDs * 4);
 		} else { // Adjust brightness during write
@@ -460,6 +749,7 @@ static PyObject *show(DotStarObject *self, PyObject *arg) {
 					uint8_t *pb = self->pBuf;
 					for(i=0; i<self->numLEDs;
 					  i++, ptr += 4, pb += 4) {
+						pb[0] = ptr[0]; // Header
 						pb[1] = (ptr[1] * scale) >> 8;
 						pb[2] = (ptr[2] * scale) >> 8;
 						pb[3] = (ptr[3] * scale) >> 8;
@@ -476,9 +766,9 @@ static PyObject *show(DotStarObject *self, PyObject *arg) {
 					i    = 4;
 					while(i--) write(self->fd, x, 1);
 					// Payload:
-					x[0] = 0xFF;
 					for(i=0; i<self->numLEDs;
 					  i++, ptr += 4) {
+						x[0] = ptr[0];
 						x[1] = (ptr[1] * scale) >> 8;
 						x[2] = (ptr[2] * scale) >> 8;
 						x[3] = (ptr[3] * scale) >> 8;
@@ -496,7 +786,7 @@ static PyObject *show(DotStarObject *self, PyObject *arg) {
 				bit      = 32;
 				while(bit--) clockPulse(self->clockMask);
 				for(i=0; i<self->numLEDs; i++, ptr += 4) {
-					word = 0xFF000000                   |
+					word = ((uint32_t)ptr[0] << 24)     |
 					 (((ptr[1] * scale) & 0xFF00) << 8) |
 					 ( (ptr[2] * scale) & 0xFF00      ) |
 					 ( (ptr[3] * scale)           >> 8);
@@ -514,12 +804,135 @@ static PyObject *show(DotStarObject *self, PyObject *arg) {
 				while(bit--) clockPulse(self->clockMask);
 			}
 		}
+		Py_END_ALLOW_THREADS
+	}
+
+	Py_INCREF(Py_None);
+	return Py_None;
+}
+
+// Queue a frame for output and return without waiting for the transfer.
+// Same arguments as show(): a strip-ready buffer, sent raw, or nothing for
+// the object's pixel buffer (brightness scaled).  The frame is copied, so
+// the caller can start on the next one right away.  Frames go out in
+// order from a writer thread; if QUEUE_SIZE frames are already waiting
+// this blocks until one has been sent.  Use wait() to sync up, e.g.
+// before changing strip settings or clearing at the end of a sweep.
+static PyObject *showAsync(DotStarObject *self, PyObject *arg) {
+	Py_buffer buf;
+	uint32_t  len, i;
+	uint8_t  *slot;
+
+	buf.buf = NULL;
+	if(!PyArg_ParseTuple(arg, "|s*", &buf)) return NULL;
+	len = buf.buf ? buf.len : self->numLEDs * 4;
+
+	if(len > self->slotSize) { // First use or larger frame: (re)alloc
+		drain(self);
+		for(i=0; i<QUEUE_SIZE; i++) {
+			if(self->queue[i]) free(self->queue[i]);
+			if(!(self->queue[i] = (uint8_t *)malloc(len))) break;
+		}
+		if(i < QUEUE_SIZE) {
+			while(i--) { free(self->queue[i]); self->queue[i] = NULL; }
+			self->slotSize = 0;
+			if(buf.buf) PyBuffer_Release(&buf);
+			return PyErr_NoMemory();
+		}
+		self->slotSize = len;
+	}
+	if(!self->running) {
+		self->head    = 0;
+		self->running = 1;
+		if(pthread_create(&self->writer, NULL, writerThread, self)) {
+			self->running = 0;
+			if(buf.buf) PyBuffer_Release(&buf);
+			PyErr_SetString(PyExc_RuntimeError,
+			  "can't start writer thread");
+			return NULL;
+		}
+	}
+
+	Py_BEGIN_ALLOW_THREADS
+	pthread_mutex_lock(&self->lock);
+	while(self->queued >= QUEUE_SIZE)
+		pthread_cond_wait(&self->cond, &self->lock);
+	// Strip went idle waiting for this frame?
+	if(self->streaming && !self->queued) self->underruns++;
+	pthread_mutex_unlock(&self->lock);
+
+	// Slot at head is free, and only this thread fills slots
+	slot = self->queue[self->head];
+	if(buf.buf) {
+		memcpy(slot, buf.buf, len);
+	} else {
+		memcpy(slot, self->pixels, len);
+		if(self->brightness) {
+			uint16_t scale = self->brightness;
+			for(i=0; i<len; i += 4) {
+				slot[i + 1] = (slot[i + 1] * scale) >> 8;
+				slot[i + 2] = (slot[i + 2] * scale) >> 8;
+				slot[i + 3] = (slot[i + 3] * scale) >> 8;
+			}
+		}
 	}
 
+	pthread_mutex_lock(&self->lock);
+	self->queueLen[self->head] = len;
+	if(++self->head >= QUEUE_SIZE) self->head = 0;
+	self->queued++;
+	self->streaming = 1;
+	pthread_cond_broadcast(&self->cond);
+	pthread_mutex_unlock(&self->lock);
+	Py_END_ALLOW_THREADS
+
+	if(buf.buf) PyBuffer_Release(&buf);
+	Py_INCREF(Py_None);
+	return Py_None;
+}
+
+// Wait until every frame from showAsync() has been sent
+static PyObject *_wait(DotStarObject *self) {
+	drain(self);
 	Py_INCREF(Py_None);
 	return Py_None;
 }
 
+// Return showAsync() queue stats as a tuple: (frames waiting or being
+// sent, underruns, frames sent).  An underrun is a frame that arrived
+// after the strip had already gone idle, i.e. the caller couldn't keep up
+// (the first frame after wait() doesn't count).
+static PyObject *getQueueStats(DotStarObject *self) {
+	uint32_t queued, underruns, sent;
+	pthread_mutex_lock(&self->lock);
+	queued    = self->queued;
+	underruns = self->underruns;
+	sent      = self->sent;
+	pthread_mutex_unlock(&self->lock);
+	return Py_BuildValue("III", queued, underruns, sent);
+}
+
+// Turn skipping of repeated frames on or off (it's on by default):
+// x.setSkipRepeats(True)           Unchanged frames resent after 1 sec
+// x.setSkipRepeats(True, refresh)  ...after 'refresh' sec, 0 = never
+// x.setSkipRepeats(False)          Send every frame
+static PyObject *setSkipRepeats(DotStarObject *self, PyObject *arg) {
+	PyObject *on;
+	double    refresh = REFRESH;
+	if(!PyArg_ParseTuple(arg, "O|d", &on, &refresh)) return NULL;
+	drain(self); // Not while the writer thread is comparing frames
+	self->skipRepeats = PyObject_IsTrue(on);
+	self->refresh     = refresh;
+	self->lastLen     = 0; // Next frame always goes out
+	Py_INCREF(Py_None);
+	return Py_None;
+}
+
+// Return (frames sent to the strip, frames skipped as repeats)
+static PyObject *getFrameStats(DotStarObject *self) {
+	return Py_BuildValue("II", self->transmitted, self->skipped);
+}
+
 // Given separate R, G, B, return a packed 32-bit color.
 // Meh, mostly here for parity w/Arduino library.
 static PyObject *Color(DotStarObject *self, PyObject *arg) {
@@ -567,20 +980,43 @@ static PyObject *getBrightness(DotStarObject *self) {
 	return result;
 }
 
-// DON'T USE THIS.  One of those "parity with Arduino library" methods,
-// but current'y doesn't work (and might never).  Supposed to return strip's
-// pixel buffer, but doesn't seem to be an easy way to do this in Python 2.X.
-// That's okay -- instead of 'raw' access to a strip's previously-allocated
-// buffer, a Python program can instead allocate its own buffer and pass this
-// to the show() method, basically achieving the same thing and then some.
+// Set SPI clock speed (hardware SPI only; the actual rate may be lower,
+// see begin()).  Takes effect from the next show().
+static PyObject *setBitrate(DotStarObject *self, PyObject *arg) {
+	uint32_t bitrate;
+	if(!PyArg_ParseTuple(arg, "I", &bitrate)) return NULL;
+	drain(self); // Queued frames go out at the rate they were shown at
+	self->bitrate = bitrate;
+	if(self->fd >= 0)
+		ioctl(self->fd, SPI_IOC_WR_MAX_SPEED_HZ, &self->bitrate);
+	Py_INCREF(Py_None);
+	return Py_None;
+}
+
+// Return requested SPI clock speed
+static PyObject *getBitrate(DotStarObject *self) {
+	return Py_BuildValue("I", self->bitrate);
+}
+
+// Return the strip's pixel buffer as a writable memoryview (4 bytes per
+// pixel, 0xFF then colors in strip order), so it can be read or changed in
+// place, e.g. with NumPy.  The strip object itself also supports the
+// buffer protocol, so memoryview(strip) does the same.
 static PyObject *getPixels(DotStarObject *self) {
-	PyObject *result = Py_BuildValue("s#",
-	  self->pixels, self->numLEDs * 4);
-	Py_INCREF(result);
-	return result;
+	return PyMemoryView_FromObject((PyObject *)self);
 }
 
 static PyObject *_close(DotStarObject *self) {
+	if(self->running) { // Finish queued frames, then stop the writer
+		drain(self);
+		pthread_mutex_lock(&self->lock);
+		self->running = 0;
+		pthread_cond_broadcast(&self->cond);
+		pthread_mutex_unlock(&self->lock);
+		Py_BEGIN_ALLOW_THREADS
+		pthread_join(self->writer, NULL);
+		Py_END_ALLOW_THREADS
+	}
 	if(self->fd) {
 		close(self->fd);
 		self->fd = -1;
@@ -595,7 +1031,12 @@ static PyObject *_close(DotStarObject *self) {
 }
 
 static void DotStar_dealloc(DotStarObject *self) {
+	uint32_t i;
 	_close(self);
+	for(i=0; i<QUEUE_SIZE; i++) if(self->queue[i]) free(self->queue[i]);
+	if(self->lastFrame) free(self->lastFrame);
+	pthread_mutex_destroy(&self->lock);
+	pthread_cond_destroy(&self->cond);
 	if(self->pBuf)   free(self->pBuf);
 	if(self->pixels) free(self->pixels);
 	self->ob_type->tp_free((PyObject *)self);
@@ -608,16 +1049,58 @@ static PyMethodDef methods[] = {
   { "clear"        , (PyCFunction)clear        , METH_NOARGS , NULL },
   { "setBrightness", (PyCFunction)setBrightness, METH_VARARGS, NULL },
   { "setPixelColor", (PyCFunction)setPixelColor, METH_VARARGS, NULL },
+  { "setPixels"    , (PyCFunction)setPixels    , METH_VARARGS, NULL },
+  { "fill"         , (PyCFunction)fill         , METH_VARARGS, NULL },
   { "show"         , (PyCFunction)show         , METH_VARARGS, NULL },
   { "Color"        , (PyCFunction)Color        , METH_VARARGS, NULL },
   { "getPixelColor", (PyCFunction)getPixelColor, METH_VARARGS, NULL },
   { "numPixels"    , (PyCFunction)numPixels    , METH_NOARGS , NULL },
   { "getBrightness", (PyCFunction)getBrightness, METH_NOARGS , NULL },
+  { "setGlobalBrightness", (PyCFunction)setGlobalBrightness, METH_VARARGS, NULL },
+  { "getGlobalBrightness", (PyCFunction)getGlobalBrightness, METH_NOARGS , NULL },
+  { "setBitrate"   , (PyCFunction)setBitrate   , METH_VARARGS, NULL },
+  { "getBitrate"   , (PyCFunction)getBitrate   , METH_NOARGS , NULL },
   { "getPixels"    , (PyCFunction)getPixels    , METH_NOARGS , NULL },
   { "close"        , (PyCFunction)_close       , METH_NOARGS , NULL },
+  { "showAsync"    , (PyCFunction)showAsync    , METH_VARARGS, NULL },
+  { "wait"         , (PyCFunction)_wait        , METH_NOARGS , NULL },
+  { "getQueueStats", (PyCFunction)getQueueStats, METH_NOARGS , NULL },
+  { "setSkipRepeats", (PyCFunction)setSkipRepeats, METH_VARARGS, NULL },
+  { "getFrameStats", (PyCFunction)getFrameStats, METH_NOARGS , NULL },
   { NULL, NULL, 0, NULL }
 };
 
+// Buffer protocol: exposes the pixel buffer (see getPixels()).  Both the
+// new interface and the old Python 2 one (used by e.g. numpy.frombuffer).
+static int getBuffer(DotStarObject *self, Py_buffer *view, int flags) {
+	return PyBuffer_FillInfo(view, (PyObject *)self, self->pixels,
+	  self->numLEDs * 4, 0, flags);
+}
+
+static Py_ssize_t getSegment(
+  DotStarObject *self, Py_ssize_t segment, void **ptr) {
+	if(segment != 0) {
+		PyErr_SetString(PyExc_SystemError, "invalid buffer segment");
+		return -1;
+	}
+	*ptr = self->pixels;
+	return self->numLEDs * 4;
+}
+
+static Py_ssize_t getSegCount(DotStarObject *self, Py_ssize_t *len) {
+	if(len) *len = self->numLEDs * 4;
+	return 1;
+}
+
+static PyBufferProcs bufferProcs = {
+	(readbufferproc)getSegment,  // bf_getreadbuffer
+	(writebufferproc)getSegment, // bf_getwritebuffer
+	(segcountproc)getSegCount,   // bf_getsegcount
+	0,                           // bf_getcharbuffer
+	(getbufferproc)getBuffer,    // bf_getbuffer
+	0,                           // bf_releasebuffer
+};
+
 static PyTypeObject DotStarObjectType = {
 	PyObject_HEAD_INIT(NULL)
 	0,                           // ob_size (not used, always set to 0)
@@ -638,8 +1121,9 @@ static PyTypeObject DotStarObjectType = {
 	0,                           // tp_str
 	0,                           // tp_getattro
 	0,                           // tp_setattro
-	0,                           // tp_as_buffer
-	Py_TPFLAGS_DEFAULT,          // tp_flags
+	&bufferProcs,                // tp_as_buffer
+	Py_TPFLAGS_DEFAULT |
+	Py_TPFLAGS_HAVE_NEWBUFFER,   // tp_flags
 	0,                           // tp_doc
 	0,                           // tp_traverse
 	0,                           // tp_clear
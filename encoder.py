@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Mouse as a position encoder, read on its own thread
+
+Painting straight from mouse events ties the column rate to the mouse's report rate (125 Hz for most USB
+mice): the strip only gets a new column when a report comes in, however fast SPI could go.  Encoder reads
+the evdev device on a thread, adding up REL_X into a running count and noting when each report arrived.
+position() is then that count plus the recent velocity times the time since the last report, so a paint
+loop can render a new column whenever the strip is ready for one, with the motion between reports filled
+in smoothly.  Extrapolation stops 'maxAhead' seconds after the last report: a mouse sends nothing when it
+isn't moving, so past that it's taken to have stopped.  A report can land short of the extrapolated
+position (the mouse slowed down); rather than step back and repaint columns, position() then holds still
+until the motion catches up, so it never goes back past a value it already returned.  It only goes back
+when the mouse really moves the other way.
+
+Usage:
+    encoder = Encoder(InputDevice('/dev/input/event0'))
+    encoder.reset()                     #count from here
+    while abs(encoder.position()) < end:
+        ...render and show column for encoder.position()...
+"""
+
+import errno
+import select
+import threading
+from collections import deque
+try:
+    from evdev import ecodes
+except ImportError:
+    from standins import ecodes     #same codes; headless (see standins.py) there may be no evdev
+from frameclock import monotonic
+
+
+class Encoder():
+    """
+    REL_X position of the evdev device 'dev', extrapolated between reports
+    'window' is how many seconds of reports the velocity is averaged over
+    """
+    def __init__(self, dev, window=0.05, maxAhead=0.02):
+        self.dev = dev
+        self.window = window
+        self.maxAhead = maxAhead
+        self.lock = threading.Lock()
+        self.moved = threading.Event()  #set on each report
+        self.total = 0                  #REL_X counts since reset()
+        self.last = 0.0                 #last value position() returned
+        self.reports = deque()          #(time, total) per report, the last 'window' seconds of them
+        self.lastTime = 0.0
+        self.lost = False               #device went away (usually a voltage sag on battery power)
+        self.running = True
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+
+    def reset(self):
+        with self.lock:
+            self.total = 0
+            self.last = 0.0
+            self.reports.clear()
+
+    def count(self):
+        """
+        REL_X counts reported since reset(), as of the last report
+        """
+        return self.total
+
+    def velocity(self):
+        """
+        Counts/second over the recent reports, 0 if the mouse has stopped
+        """
+        with self.lock:
+            if len(self.reports) < 2: return 0.0
+            (t0, p0), (t1, p1) = self.reports[0], self.reports[-1]
+        if monotonic() - t1 > self.maxAhead: return 0.0
+        return (p1 - p0) / (t1 - t0)
+
+    def position(self, now=None):
+        """
+        Estimated counts since reset() at monotonic time 'now' (default: now)
+        """
+        if now is None: now = monotonic()
+        with self.lock:
+            pos = float(self.total)
+            direction = self.total - self.last   #which way the reports have gone since last time
+            if len(self.reports) >= 2:
+                (t0, p0), (t1, p1) = self.reports[0], self.reports[-1]
+                ahead = min(now - t1, self.maxAhead)
+                if ahead > 0: pos += (p1 - p0) * ahead / (t1 - t0)
+                direction = p1 - p0
+            #don't step back past what was already returned, unless the mouse itself is going that way
+            if direction > 0 or (direction == 0 and self.last > 0): pos = max(pos, self.last)
+            elif direction < 0 or self.last < 0: pos = min(pos, self.last)
+            self.last = pos
+        return pos
+
+    def idle(self):
+        """
+        Seconds since the last report
+        """
+        return monotonic() - self.lastTime
+
+    def wait(self, timeout):
+        """
+        Sleep until the next report, or for 'timeout' seconds
+        """
+        self.moved.clear()
+        return self.moved.wait(timeout)
+
+    def _run(self):
+        fd = self.dev.fileno()
+        while self.running:
+            try:
+                if not select.select([fd], [], [], 0.1)[0]: continue
+                dx = 0
+                for event in self.dev.read():
+                    if event.type == ecodes.EV_REL and event.code == ecodes.REL_X:
+                        dx += event.value
+            except (IOError, OSError, select.error) as e:
+                if e.args and e.args[0] in (errno.EAGAIN, errno.EINTR): continue
+                self.lost = True
+                self.moved.set()
+                return
+            if not dx: continue
+            now = monotonic()
+            with self.lock:
+                self.total += dx
+                self.reports.append((now, self.total))
+                while now - self.reports[0][0] > self.window: self.reports.popleft()
+            self.lastTime = now
+            self.moved.set()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+A single-threaded event loop: file descriptors, timers and signals, dispatched from one epoll
+
+The scripts used to block in a different place for each input (epoll.poll(-1) on the mouse, a spin on the
+buttons) and did their USB work inside the SIGUSR1/SIGUSR2 handlers, ie: whenever the signal happened to
+arrive, halfway through a paint sweep or a strip.show() included.  Here every source is a callback run from
+run(), one at a time, in the main thread:
+    addReader(f, callback)      when 'f' (a file descriptor, or anything with fileno()) is readable
+    callLater(seconds, callback) / callAt(monotonic time, callback)
+    addSignal(signum, callback) after signal 'signum' arrives; the real handler only notes it, and
+                                signal.set_wakeup_fd() wakes the epoll so it's run right away
+    callFromThread(callback)    as soon as possible; the one method other threads may call, so a
+                                thread can hand its results to the loop (eg: an image it loaded)
+A callback that takes a while (a paint sweep) just delays the others, nothing runs in the middle of it.
+This is python 2, so there's no asyncio; this is the part of it the scripts need.
+
+Usage:
+    loop = EventLoop()
+    loop.addReader(buttons, onButtons)
+    loop.addSignal(signal.SIGUSR1, scandir)
+    loop.callLater(0.25, clear)
+    loop.run()                  #until stop()
+"""
+
+import errno
+import fcntl
+import heapq
+import os
+import select
+import signal
+from collections import deque
+from frameclock import monotonic
+
+
+def _fd(f):
+    return f if isinstance(f, int) else f.fileno()
+
+
+class EventLoop():
+    def __init__(self):
+        self.epoll = select.epoll()
+        self.readers = {}       #fd: (callback, args)
+        self.timers = []        #heap of [when, sequence, callback, args]
+        self.sequence = 0       #keeps timers due at the same time in order
+        self.signals = {}       #signum: callback
+        self.caught = []        #signals waiting for their callback
+        self.fromThreads = deque()  #(callback, args) from callFromThread()
+        self.running = False
+        self.wakeRead, self.wakeWrite = os.pipe()
+        for fd in (self.wakeRead, self.wakeWrite):
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+        self.addReader(self.wakeRead, self._drainWakeup)
+        signal.set_wakeup_fd(self.wakeWrite)
+
+    def close(self):
+        signal.set_wakeup_fd(-1)
+        for signum in list(self.signals):
+            self.removeSignal(signum)
+        self.epoll.close()
+        os.close(self.wakeRead)
+        os.close(self.wakeWrite)
+
+    def addReader(self, f, callback, *args):
+        fd = _fd(f)
+        if fd in self.readers:
+            self.epoll.modify(fd, select.EPOLLIN)
+        else:
+            self.epoll.register(fd, select.EPOLLIN)
+        self.readers[fd] = (callback, args)
+
+    def removeReader(self, f):
+        fd = _fd(f)
+        if self.readers.pop(fd, None) is not None:
+            try:
+                self.epoll.unregister(fd)
+            except (IOError, OSError, ValueError):
+                pass    #already closed, eg: the mouse was unplugged
+
+    def callAt(self, when, callback, *args):
+        """
+        Run callback(*args) at monotonic time 'when'; returns a handle for cancel()
+        """
+        self.sequence += 1
+        timer = [when, self.sequence, callback, args]
+        heapq.heappush(self.timers, timer)
+        return timer
+
+    def callLater(self, delay, callback, *args):
+        return self.callAt(monotonic() + delay, callback, *args)
+
+    def cancel(self, timer):
+        timer[2] = None     #left in the heap, skipped when it comes up
+
+    def callFromThread(self, callback, *args):
+        """
+        Run callback(*args) from run() as soon as it can; this one is safe to call from any thread
+        """
+        self.fromThreads.append((callback, args))  #deque appends are atomic, no lock needed
+        try:
+            os.write(self.wakeWrite, b'\0')
+        except OSError:
+            pass    #pipe full: the loop is being woken anyway
+
+    def addSignal(self, signum, callback):
+        self.signals[signum] = callback
+        signal.signal(signum, self._caught)
+
+    def removeSignal(self, signum):
+        if self.signals.pop(signum, None) is not None:
+            signal.signal(signum, signal.SIG_DFL)
+
+    def stop(self):
+        self.running = False
+
+    def run(self):
+        self.running = True
+        while self.running:
+            self.runOnce()
+
+    def runOnce(self, timeout=None):
+        """
+        Wait for something to happen (up to 'timeout' seconds, None = as long as it takes) and handle it
+        """
+        if self.timers:
+            untilTimer = max(self.timers[0][0] - monotonic(), 0)
+            if timeout is None or untilTimer < timeout: timeout = untilTimer
+        try:
+            events = self.epoll.poll(-1 if timeout is None else timeout)
+        except (IOError, OSError) as e:
+            if e.errno != errno.EINTR: raise
+            events = []     #a signal; its handler has run, see below
+        for fd, mask in events:
+            reader = self.readers.get(fd)
+            if reader is not None:
+                reader[0](*reader[1])
+        while self.caught:
+            callback = self.signals.get(self.caught.pop(0))
+            if callback is not None: callback()
+        while self.fromThreads:
+            callback, args = self.fromThreads.popleft()
+            callback(*args)
+        now = monotonic()
+        while self.timers and self.timers[0][0] <= now:
+            when, sequence, callback, args = heapq.heappop(self.timers)
+            if callback is not None: callback(*args)
+
+    def _caught(self, signum, frame):
+        #the real signal handler; it can run between any two lines of the program, so only make a note
+        self.caught.append(signum)
+
+    def _drainWakeup(self):
+        try:
+            while os.read(self.wakeRead, 64): pass
+        except OSError:
+            pass
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Frame pacing for the LED animations
+
+FrameClock paces a render loop to a target frame rate using deadlines on a monotonic clock,
+and reports how much wall time passed so motion can be advanced by time rather than by frame count.
+If rendering can't keep up, missed deadlines are dropped (not made up later) and counted,
+so the animation runs at the same speed on a slow Pi, just with fewer frames.
+
+Usage:
+    clock = FrameClock(24)
+    while True:
+        dt = clock.tick()       #waits for the next frame, returns seconds since the last one
+        ...move things by speed*dt, render and show...
+"""
+
+import time
+from collections import deque
+
+try:
+    monotonic = time.monotonic
+except AttributeError:
+    #python 2 has no monotonic clock in the time module, so read CLOCK_MONOTONIC from libc directly
+    import ctypes
+    import ctypes.util
+
+    class _timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    _CLOCK_MONOTONIC = 1
+    _lib = ctypes.CDLL(ctypes.util.find_library('rt') or ctypes.util.find_library('c'))
+    _clock_gettime = _lib.clock_gettime
+    _clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_timespec)]
+
+    def monotonic():
+        t = _timespec()
+        _clock_gettime(_CLOCK_MONOTONIC, ctypes.byref(t))
+        return t.tv_sec + t.tv_nsec * 1e-9
+
+
+class FrameClock():
+    """
+    Deadline based frame pacer
+    'fps' is the target frame rate; 'maxStep' caps the time returned by tick() (in frames), so that
+    resuming after a pause (eg: the strip was off, or another mode ran) doesn't make things jump
+    """
+    def __init__(self, fps, maxStep=4):
+        self.period = 1.0 / fps
+        self.maxStep = maxStep * self.period
+        self.dropped = 0            #deadlines skipped because a frame ran late
+        self.times = deque(maxlen=int(fps) + 1)  #recent tick times, for fps()
+        self.reset()
+    def reset(self):
+        """
+        Start pacing over from now (call after the loop has been paused)
+        """
+        self.deadline = None
+        self.last = None
+        self.times.clear()
+    def tick(self):
+        """
+        Sleep until the next frame deadline and return the seconds elapsed since the previous tick
+        """
+        now = monotonic()
+        if self.deadline is None:   #first frame
+            self.deadline = self.last = now
+        self.deadline += self.period
+        if now < self.deadline:
+            time.sleep(self.deadline - now)
+            now = monotonic()
+        else:
+            #running late: skip any deadlines that have already passed
+            missed = int((now - self.deadline) / self.period)
+            self.dropped += missed
+            self.deadline += missed * self.period
+        dt = min(now - self.last, self.maxStep)
+        self.last = now
+        self.times.append(now)
+        return dt
+    def fps(self):
+        """
+        Achieved frame rate over roughly the last second
+        """
+        if len(self.times) < 2: return 0.0
+        return (len(self.times) - 1) / (self.times[-1] - self.times[0])
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Headless benchmark of the painter and soothe scripts themselves, against a recorded strip
+
+Runs DotStarPiPainter.py and then PersistenceOfVisionSoothe.py, in this process, with no Pi, strip, buttons
+or USB drive: DOTSTAR_BACKEND records their frames to a file (stripbackend.py), with each taking as long as
+it would on the wire (DOTSTAR_REALTIME); the buttons are stand-ins pressed from here (standins.py); and the
+USB drive is a temporary folder holding one test image.  Each script runs until it gets SIGINT, as if
+Ctrl-C was pressed, and cleans up as usual.
+ - painter: go is held for the test time, so time-based sweeps repeat; reports columns/sec
+ - soothe: reports achieved fps and dropped frames, from its own FrameClock
+and both report frame-to-frame timing from the recorded timestamps.
+Needs numpy, PIL and the lightpaint module built (make).
+Usage: python headlessTest.py [seconds per test]
+"""
+
+import os
+import runpy
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+from PIL import Image
+import standins
+from frameclock import monotonic
+from stripbackend import readRecording
+
+seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+here = os.path.dirname(os.path.abspath(__file__))
+
+def waitFor(condition, timeout=30.0):
+    endTime = monotonic() + timeout
+    while True:
+        value = condition()
+        if value: return value
+        if monotonic() > endTime: raise RuntimeError("timed out waiting for the script")
+        time.sleep(0.05)
+
+def intervals(times):
+    gaps = sorted(b - a for a, b in zip(times, times[1:]))
+    if not gaps: return "no frames"
+    return "frame interval ms: mean %.2f, median %.2f, 99%% %.2f, max %.2f" % (
+      1000 * sum(gaps) / len(gaps), 1000 * gaps[len(gaps) // 2],
+      1000 * gaps[int(len(gaps) * 0.99)], 1000 * gaps[-1])
+
+def run(script, drive):
+    """
+    Run 'script' while drive(its globals) runs on a thread, then stop it with SIGINT
+    Returns what drive() returned and the (timestamp, frame)s the script showed
+    """
+    name = os.path.splitext(script)[0]
+    recording = os.path.join(tmp, name + '.rec')
+    os.environ['DOTSTAR_BACKEND'] = 'file:' + recording
+    result = {}
+    def driver():
+        try:
+            #while it runs, run_path() has the script in sys.modules under 'name'
+            result['drive'] = drive(waitFor(lambda: sys.modules.get(name)).__dict__)
+        finally:
+            os.kill(os.getpid(), signal.SIGINT)
+    thread = threading.Thread(target=driver)
+    thread.daemon = True
+    thread.start()
+    namespace = runpy.run_path(os.path.join(here, script), run_name=name)
+    thread.join()
+    namespace['strip'].close()  #the recording is complete once this file is
+    return result.get('drive'), list(readRecording(recording))
+
+def paintDrive(script):
+    waitFor(lambda: script.get('lightpaint') is not None)   #image scanned and loaded
+    pipeline = script['pipeline']
+    startShown, startTime = pipeline.shown, monotonic()
+    standins.GPIO.press(script['pin_go'])
+    time.sleep(seconds)
+    standins.GPIO.release(script['pin_go'])
+    time.sleep(0.1)         #debounce, so the release is seen before the last sweep ends
+    waitFor(lambda: not pipeline.painting, timeout=60.0)
+    return startTime, monotonic(), pipeline.shown - startShown
+
+def sootheDrive(script):
+    clock = waitFor(lambda: script.get('clock'))
+    waitFor(lambda: clock.times)    #first frame shown
+    startDropped, startTime = clock.dropped, monotonic()
+    time.sleep(seconds)
+    return startTime, monotonic(), clock.fps(), clock.dropped - startDropped, script['framerate']
+
+#SIGINT is how the scripts are stopped, so make sure it raises KeyboardInterrupt even if it's ignored here
+signal.signal(signal.SIGINT, signal.default_int_handler)
+tmp = tempfile.mkdtemp()
+try:
+    usb = os.path.join(tmp, 'usb')
+    os.mkdir(usb)
+    img = Image.new('RGB', (1000, 144))
+    img.putdata([((x * 7) & 255, (y * 3) & 255, (x * y) & 255) for y in range(144) for x in range(1000)])
+    img.save(os.path.join(usb, 'test.png'))
+    os.environ.update(LIGHTPAINT_USB=usb, LIGHTPAINT_CACHE=os.path.join(tmp, 'cache'),
+      LIGHTPAINT_ALWAYS_ON='1', DOTSTAR_REALTIME='1')
+
+    (startTime, endTime, columns), frames = run('DotStarPiPainter.py', paintDrive)
+    print ("painter: %.0f columns/sec" % (columns / (endTime - startTime)))
+    print ("  " + intervals([t for t, frame in frames if startTime <= t <= endTime]))
+
+    (startTime, endTime, fps, dropped, framerate), frames = run('PersistenceOfVisionSoothe.py', sootheDrive)
+    print ("soothe: %.1f fps (target %d), %d dropped" % (fps, framerate, dropped))
+    print ("  " + intervals([t for t, frame in frames if startTime <= t <= endTime]))
+finally:
+    shutil.rmtree(tmp)
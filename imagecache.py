@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of ready-to-paint images
+
+Loading an image (decode, resize, build the LightPaint tables) takes long enough to stall painting.
+ImageCache keeps recently used results in memory, bounded by a byte budget (least recently used go first),
+and builds the images that are likely to be wanted next on a background thread.
+
+Usage:
+    cache = ImageCache(loadFn)     #loadFn(filepath) returns (lightpaint, sizeInBytes)
+    lightpaint = cache.get(filepath)             #instant if cached, else loads (or waits for the background load)
+    lightpaint = cache.fetch(filepath, done)     #never waits: None if not cached, and done(filepath, lightpaint)
+                                                 #is called from the background thread once it's loaded
+    cache.prefetch([nextFilepath, prevFilepath]) #build these in the background
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class ImageCache():
+    """
+    LRU cache of loaded images with background prefetching
+    'load' is a function(filepath) -> (obj, nbytes); 'budget' is the max total nbytes to keep
+    The most recently used image is always kept, even if it alone is over budget
+    """
+    def __init__(self, load, budget=32*1024*1024):
+        self.load = load
+        self.budget = budget
+        self.cache = OrderedDict()  #filepath -> (obj, nbytes), oldest first
+        self.used = 0               #total nbytes in cache
+        self.pending = []           #filepaths to prefetch, in order
+        self.wanted = []            #filepaths fetch()ed, built before any prefetching
+        self.waiting = {}           #filepath -> [done callbacks from fetch()]
+        self.loading = None         #filepath the worker is building right now
+        self.generation = 0         #bumped by clear(), so a load that was in flight is discarded
+        self.cond = threading.Condition()
+        self.worker = threading.Thread(target=self._run)
+        self.worker.daemon = True   #don't hold up exit
+        self.worker.start()
+
+    def __contains__(self, filepath):
+        with self.cond:
+            return filepath in self.cache
+
+    def get(self, filepath):
+        """
+        Return the loaded image, loading it now if it is neither cached nor being prefetched
+        """
+        with self.cond:
+            if filepath in self.pending: self.pending.remove(filepath)
+            while self.loading == filepath:   #worker is already on it, wait rather than load twice
+                self.cond.wait()
+            if filepath in self.cache:
+                self.cache[filepath] = self.cache.pop(filepath)   #move to most recently used
+                return self.cache[filepath][0]
+        obj, nbytes = self.load(filepath)
+        with self.cond:
+            self._store(filepath, obj, nbytes)
+        return obj
+
+    def fetch(self, filepath, done):
+        """
+        get() without the wait: return the loaded image if it's cached, else None, and have the background
+        thread load it next, then call done(filepath, image) on that thread (image is None if loading
+        failed).  clear() cancels the call
+        """
+        with self.cond:
+            if filepath in self.cache:
+                self.cache[filepath] = self.cache.pop(filepath)   #move to most recently used
+                return self.cache[filepath][0]
+            if filepath in self.pending: self.pending.remove(filepath)
+            if filepath not in self.wanted: self.wanted.append(filepath)
+            self.waiting.setdefault(filepath, []).append(done)
+            self.cond.notify_all()
+        return None
+
+    def prefetch(self, filepaths):
+        """
+        Replace the list of images to build in the background (first is built first)
+        """
+        with self.cond:
+            self.pending = [f for f in filepaths if f not in self.cache]
+            self.cond.notify_all()
+
+    def clear(self):
+        """
+        Forget everything, eg: when the USB drive is removed
+        """
+        with self.cond:
+            self.cache.clear()
+            self.used = 0
+            self.pending = []
+            self.wanted = []
+            self.waiting.clear()
+            self.generation += 1
+
+    def _store(self, filepath, obj, nbytes, keep=None):
+        #caller holds self.cond.  'keep' stays the most recently used (and so is never evicted)
+        if filepath in self.cache:
+            self.used -= self.cache.pop(filepath)[1]
+        self.cache[filepath] = (obj, nbytes)
+        self.used += nbytes
+        if keep in self.cache:
+            self.cache[keep] = self.cache.pop(keep)
+        while self.used > self.budget and len(self.cache) > 1:   #evict least recently used
+            self.used -= self.cache.popitem(last=False)[1][1]
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not (self.wanted or self.pending):
+                    self.cond.wait()
+                filepath = self.loading = (self.wanted or self.pending)[0]
+                if filepath in self.pending: self.pending.remove(filepath)
+                generation = self.generation
+            try:
+                obj, nbytes = self.load(filepath)
+            except Exception as e:
+                print ("Loading '%s' failed: %s" % (filepath, e))
+                obj = None
+            callbacks = []
+            with self.cond:
+                if generation == self.generation:   #else cleared meanwhile, and a fetch() since wants it again
+                    if filepath in self.wanted: self.wanted.remove(filepath)
+                    callbacks = self.waiting.pop(filepath, [])
+                    if obj is not None and callbacks:   #wanted now, so it's the most recently used
+                        self._store(filepath, obj, nbytes)
+                    elif obj is not None:   #the image in use (most recently used) mustn't be pushed out by a prefetch
+                        self._store(filepath, obj, nbytes, keep=next(reversed(self.cache), None))
+                self.loading = None
+                self.cond.notify_all()
+            for done in callbacks:
+                done(filepath, obj)
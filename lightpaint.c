@@ -17,6 +17,7 @@
   ------------------------------------------------------------------------*/
 
 #include <python2.7/Python.h>
+#include <pthread.h>
 
 // DotStar LED power estimates measured & divided from 100 pixels @ 5.1VDC.
 #define mA0  1.25 // LED current when off (driver logic still needs some)
@@ -24,18 +25,104 @@
 #define mAG  9.90 // + current for 100% green
 #define mAB  8.45 // + current for 100% blue
 
+#define MAX_THREADS 8 // Upper limit for 'threads' keyword
+
+#define TABLES_SIZE (256 * 9 + 1) // getTables() length, last is header
+
 // A LightPaint object is requested for a Python image before painting:
 typedef struct {
 	PyObject_HEAD
-	uint16_t  width, height; // Image dimensions in pixels
+	uint32_t  width;         // Image dimensions in pixels
+	uint16_t  height;
 	uint8_t   offset[3];     // LED strip R,G,B offsets within pixel
-	uint8_t  *pixels;        // -> Image data in RGB format
+	uint8_t  *pixels;        // -> Image data, R,G,B, column-major
+	Py_buffer pixelBuf;      // Caller's buffer if used in place (columns)
 	uint8_t  *tables;        // Various dithering lookup tables
 	double    px;            // Last x value passed to dither()
-	Py_buffer pixelBuf;      // Python image pixel buffer
 	uint8_t   vFlip;         // If >0, input at BOTTOM of strip
+	uint8_t   threads;       // Threads to use for power estimate
+	uint8_t   header;        // DotStar pixel header (0xE0 + 5-bit level)
+	double    mA[3][256];    // R,G,B current (mA) for each 8-bit level
 } LightPaintObject;
 
+// Power estimate for a range of image columns, one per thread
+typedef struct {
+	LightPaintObject *self;
+	double           *colC;   // -> Per-column current (mA) output
+	uint32_t          x0, x1; // Column range, x0 to x1-1
+} EstimateJob;
+
+static void *estimateColumns(void *arg) {
+	EstimateJob      *job  = (EstimateJob *)arg;
+	LightPaintObject *self = job->self;
+	uint32_t          x, y;
+	uint8_t          *in;
+	int               inc = 3;
+	double            colC;
+
+	for(x=job->x0; x<job->x1; x++) { // For each column...
+		colC = 0.0;              // Clear column sum
+		in   = &self->pixels[x * self->height * 3];
+		if(self->vFlip) { // Sum from image top, as always
+			in  += (self->height - 1) * 3;
+			inc  = -3;
+		}
+		for(y=0; y<self->height; y++, in += inc) { // Each row...
+			// Python image order is always R,G,B; strip
+			// color order doesn't matter at this stage.
+			// Est. pixel mA, add to column sum
+			colC += mA0 + self->mA[0][in[0]] +
+			  self->mA[1][in[1]] + self->mA[2][in[2]];
+		}
+		job->colC[x] = colC;
+	}
+	return NULL;
+}
+
+// Estimate average and peak column current (mA) at the color balance
+// settings (before any power limiting).  Uses self->threads threads,
+// each taking a range of columns; the GIL is released meanwhile.
+// Returns 0 on success, -1 if out of memory.
+static int estimate(LightPaintObject *self, double *avg, double *peak) {
+	EstimateJob job[MAX_THREADS];
+	pthread_t   tid[MAX_THREADS];
+	uint8_t     started[MAX_THREADS];
+	uint32_t    x, t, n = self->threads;
+	double     *colC;
+
+	if(!(colC = (double *)malloc(self->width * sizeof(double))))
+		return -1;
+	if(n > self->width) n = self->width;
+	if(n < 1)           n = 1;
+
+	Py_BEGIN_ALLOW_THREADS
+	for(t=0; t<n; t++) {
+		job[t].self = self;
+		job[t].colC = colC;
+		job[t].x0   = self->width *  t      / n;
+		job[t].x1   = self->width * (t + 1) / n;
+		// Last range runs here; others get a thread if possible
+		started[t]  = (t < n - 1) &&
+		  !pthread_create(&tid[t], NULL, estimateColumns, &job[t]);
+		if(!started[t]) estimateColumns(&job[t]);
+	}
+	for(t=0; t<n; t++) {
+		if(started[t]) pthread_join(tid[t], NULL);
+	}
+	Py_END_ALLOW_THREADS
+
+	// Sum in column order so result doesn't depend on thread count
+	*avg  = 0.0;
+	*peak = 0.0;
+	for(x=0; x<self->width; x++) {
+		if(colC[x] > *peak) *peak = colC[x];
+		*avg += colC[x];
+	}
+	*avg /= (double)self->width;
+	free(colC);
+	return 0;
+}
+
 // CONSTRUCTOR: allocate a new LightPaint object for a given PIL Image and
 // Adafruit_DotStar strip.  Required arguments are: Python image pixel data
 // (using img.tostring()), pixel dimensions (img.size; w,h as tuple),
@@ -44,7 +131,16 @@ typedef struct {
 // can optionally be passed as a keyword argument, e.g. append "order='gbr'"
 // if using older DotStar pixels (BRG is default).  Optionally pass
 // "vflip='true'" to flip image vertically if input end of strip is at the
-// bottom rather than top.
+// bottom rather than top.  The pixel data is copied (column-major, with
+// vflip applied, so dither() reads each column contiguously) and not kept
+// by the object, unless "layout='columns'" says it's already that way
+// (see below), in which case it's used in place.  "threads=N" splits
+// the power estimate across N threads (default 1).
+// "globalBrightness=True" lets the power limiter dim with the DotStars'
+// 5-bit per-pixel brightness field, rather than by scaling colors down
+// alone, keeping more of the 8-bit color range (see STEP 2).  Off by
+// default: on some LEDs that field is applied by a slower PWM, which can
+// show as banding in a fast-moving long exposure.
 static PyObject *LightPaint_new(
   PyTypeObject *type, PyObject *arg, PyObject *kw) {
         LightPaintObject *self = NULL;
@@ -58,6 +154,12 @@ static PyObject *LightPaint_new(
 	char             *order;            // 'order' value as C string
 	char             *vf;               // 'vflip' value as C string
         uint8_t           vFlip = 0;        // If set, input at strip bottom
+	const void       *tables = NULL;    // 'tables' value (from getTables())
+	Py_ssize_t        tablesLen = 0;
+	long              threads = 1;      // 'threads' value
+	uint8_t           global = 0;       // 'globalBrightness' value
+	char             *lo;               // 'layout' value as C string
+	uint8_t           columns = 0;      // If set, pixels used in place
 
 	// See comments above re: required arguments
 	if(!PyArg_ParseTuple(arg, "s*(II)(ddd)(bbb)(II)",
@@ -88,56 +190,138 @@ static PyObject *LightPaint_new(
 			vFlip = ((!strcasecmp(vf, "true")) ||
 			  !strcmp(vf, "1"));
 		}
+
+		// Use keyword 'tables' to pass dither tables previously
+		// returned by getTables() for the same image and settings
+		// (e.g. from a disk cache), skipping the power estimate and
+		// table calculations.  None is the same as not passing it.
+		if((string = PyDict_GetItemString(kw, "tables")) &&
+		   (string != Py_None)) {
+			if(PyObject_AsReadBuffer(string, &tables, &tablesLen)
+			  || (tablesLen != TABLES_SIZE)) {
+				if(!PyErr_Occurred()) PyErr_SetString(
+				  PyExc_ValueError, "tables: wrong length");
+				PyBuffer_Release(&pixelBuf);
+				return NULL;
+			}
+		}
+
+		// Use keyword 'threads' to set the number of threads used
+		// for estimating power (helps with very wide images).
+		if((string = PyDict_GetItemString(kw, "threads"))) {
+			threads = PyInt_AsLong(string);
+			if((threads == -1) && PyErr_Occurred()) {
+				PyBuffer_Release(&pixelBuf);
+				return NULL;
+			}
+			if(threads < 1)           threads = 1;
+			if(threads > MAX_THREADS) threads = MAX_THREADS;
+		}
+
+		// Use keyword 'globalBrightness' to let the power limiter
+		// use the LEDs' 5-bit brightness field (see above).
+		if((string = PyDict_GetItemString(kw, "globalBrightness")))
+			global = PyObject_IsTrue(string) > 0;
+
+		// Use keyword 'layout' to say how the pixel data is laid
+		// out: "layout='rows'" (default) is img.tostring(), row by
+		// row, "layout='columns'" is column-major with each column
+		// already in strip order (flipped if vflip), as stored by
+		// paintcache.py.  Columns aren't copied: the object holds
+		// on to the buffer (e.g. an mmap of the stored file, so
+		// only the columns being painted need be in memory) until
+		// it's freed, and it mustn't be closed or changed meanwhile.
+		if((string = PyDict_GetItemString(kw, "layout")) &&
+		   (lo = PyString_AsString(string))) {
+			if(!strcasecmp(lo, "columns")) {
+				columns = 1;
+			} else if(strcasecmp(lo, "rows")) {
+				PyErr_SetString(PyExc_ValueError,
+				  "layout: 'rows' or 'columns'");
+				PyBuffer_Release(&pixelBuf);
+				return NULL;
+			}
+		}
+	}
+
+	if(pixelBuf.len < (Py_ssize_t)width * height * 3) {
+		PyErr_SetString(PyExc_ValueError, "pixels: too short for size");
+		PyBuffer_Release(&pixelBuf);
+		return NULL;
 	}
 
 	// Allocate LightPaintObject...
 	if((self = (LightPaintObject *)type->tp_alloc(type, 0))) {
-		// Allocate space for conversion tables...
-		if((self->tables = (uint8_t *)malloc(height * 3 + 256 * 9))) {
+		// Allocate space for conversion tables and pixels (unless
+		// they're used in place)...
+		if((self->tables = (uint8_t *)malloc(height * 3 + 256 * 9)) &&
+		   (columns ||
+		    (self->pixels = (uint8_t *)malloc(width * height * 3)))) {
 			// Success!  Save image parameters.
-			self->pixels   = pixelBuf.buf;
 			self->width    = width;
 			self->height   = height;
 			self->px       = 2.0;
-			self->pixelBuf = pixelBuf; // Released in destructor
 			self->vFlip    = vFlip;
+			self->threads  = threads;
+			self->header   = 0xFF; // Full brightness
 			memcpy(self->offset, offset, sizeof(offset));
 
+			uint32_t x;
+			uint16_t y, c, i, j, n;
+			uint8_t *in, *out;
+
+			if(columns) {
+				// Already as below; keep the buffer, released
+				// by the destructor
+				self->pixels   = pixelBuf.buf;
+				self->pixelBuf = pixelBuf;
+			} else {
+				// Transpose image to column-major order, so
+				// each column dither() reads is one contiguous
+				// run.  Rows are stored in strip order
+				// (flipped if vFlip).
+				for(y=0, in=pixelBuf.buf; y<height; y++) {
+					out = &self->pixels[
+					  (vFlip ? height-1-y : y) * 3];
+					for(x=0; x<width; x++, in += 3,
+					  out += height * 3) {
+						out[0] = in[0];
+						out[1] = in[1];
+						out[2] = in[2];
+					}
+				}
+				PyBuffer_Release(&pixelBuf);
+			}
+
+			double   colMaxC, // Maximum column current
+			         colAvgC, // Average column current
+			         mA;
+
+			// Milliamp ratings for each R,G,B level at given
+			// maximums, used for power estimates
+			for(c=0; c<3; c++) {
+				mA = ((c == 0) ? mAR : (c == 1) ? mAG : mAB) *
+				  (double)max[c] / 255.0;
+				for(i=0; i<256; i++) {
+					self->mA[c][i] = pow((double)i / 255.0,
+					  gamma[c]) * mA;
+				}
+			}
+
+			if(tables) { // Precomputed, skip steps 1-3
+				memcpy(self->tables, tables, 256 * 9);
+				self->header = ((uint8_t *)tables)[256 * 9];
+				return (PyObject *)self;
+			}
+
 			// STEP 1 of 3: estimate average and max power at
 			// given color balance settings.
 
-			uint16_t x, y, c, i, j, n;
-			uint8_t *in, r, g, b;
-			double   colMaxC = 0.0, // Maximum column current
-			         colAvgC = 0.0, // Average column current
-			         colC,          // Current column current
-			         mA[3];
-
-			// Milliamp ratings for given R,G,B maximums
-			mA[0] = mAR * (double)max[0] / 255.0;
-			mA[1] = mAG * (double)max[1] / 255.0;
-			mA[2] = mAB * (double)max[2] / 255.0;
-
-			for(x=0; x<width; x++) { // For each column...
-				colC = 0.0;      // Clear column sum
-				for(y=0; y<height; y++) { // Each row...
-					// Python image order is always
-					// R,G,B; strip color order doesn't
-					// matter at this stage.
-					in    = &self->pixels[(y*width+x)*3];
-					r     = *in++;
-					g     = *in++;
-					b     = *in;
-					// Est. pixel mA, add to column sum
-					colC += mA0 +
-					  pow((double)r/255.0,gamma[0])*mA[0]+
-					  pow((double)g/255.0,gamma[1])*mA[1]+
-					  pow((double)b/255.0,gamma[2])*mA[2];
-				}
-				if(colC > colMaxC) colMaxC = colC;
-				colAvgC += colC;
+			if(estimate(self, &colAvgC, &colMaxC)) {
+				PyErr_NoMemory();
+				Py_DECREF(self); // Destructor frees the rest
+				return NULL;
 			}
-			colAvgC /= (double)width;
 			//printf("Avg current: %f mA\n", colAvgC);
 			//printf("Peak current: %f mA\n", colMaxC);
 
@@ -148,6 +332,17 @@ static PyObject *LightPaint_new(
 			s2 = (double)mAavg  / colAvgC; // Scale for avg mA
 			if(s2 < s1) s1 = s2;   // Use smaller of two, and
 			if(s1 > 1.0) s1 = 1.0; // never increase brightness
+			if(global && (s1 < 1.0)) {
+				// Dim with the 5-bit global level (1-31,
+				// current is proportional to it) as far as
+				// it goes, and colors only for the rest,
+				// e.g. s1 = 0.3 gives level 10 and colors at
+				// 0.93 of max, rather than 0.3 of max.
+				n = (uint16_t)ceil(s1 * 31.0);
+				if(n < 1) n = 1;
+				self->header = 0xE0 | n;
+				s1 = s1 * 31.0 / (double)n;
+			}
 			// Adjust 'max' values by power scale factor
 			for(x=0; x<3; x++) {
 				max[x] = (uint8_t)((double)max[x] * s1 + 0.5);
@@ -176,33 +371,33 @@ static PyObject *LightPaint_new(
 					for(j=i; (j<256) &&
 					  (self->tables[c * 256 + j] <= n);
 					  j++);
+					if(j > 255) j = 255; // None brighter
 					self->tables[768 + c * 256 + i] =
 					  self->tables[c * 256 + j];
 				}
 			}
 
-			Py_INCREF(self); // Done, save object
-		} else { // tables malloc failed
-			free(self);
-			self = NULL;
+		} else { // tables or pixels malloc failed
+			PyBuffer_Release(&pixelBuf);
+			Py_DECREF(self); // Destructor frees whichever worked
+			return PyErr_NoMemory();
 		}
+	} else {
+		PyBuffer_Release(&pixelBuf);
 	}
 
-	// pixelBuf is NOT released here!  Needs to stay resident until
-	// destructor is called.
 	return (PyObject *)self;
 }
 
-// Process one column from source image to dest LED buffer.  Interpolates
-// between image columns, reorders R,G,B, applies 16-bit gamma correction
-// and diffusion dithering.
-static PyObject *dither(LightPaintObject *self, PyObject *arg) {
-	Py_buffer ledBuf;
-	double    x;
-	uint32_t  lCol, rCol, rowInc;
+// Process one column from source image to dest LED buffer (height * 4
+// bytes).  Interpolates between image columns, reorders R,G,B, applies
+// 16-bit gamma correction and diffusion dithering.  x is 0.0 to 1.0
+// across the image (anything else is clamped to that).
+static void ditherColumn(LightPaintObject *self, uint8_t *ledPtr, double x) {
+	uint32_t  lCol, rCol;
 	uint16_t  lWeight, rWeight, e, y;
 	uint8_t   n,
-	         *ledPtr, *leftPtr, *rightPtr,
+	         *leftPtr, *rightPtr,
 	         *rLo   = self->tables, // Gamma lookup tables for R,G,B
 	         *gLo   = &rLo[256],    // First 3 are 8-bit lower brightness
 	         *bLo   = &gLo[256],
@@ -214,7 +409,10 @@ static PyObject *dither(LightPaintObject *self, PyObject *arg) {
 	         *bFrac = &gFrac[256],
 	         *ePtr  = &bFrac[256];  // Last is dither error accumulator
 
-	if(!PyArg_ParseTuple(arg, "s*d", &ledBuf, &x)) return NULL;
+	// x outside 0.0 to 1.0 (or NaN) would read past the image; clamp it
+	if(!(x >= 0.0))  x = 0.0;
+	else if(x > 1.0) x = 1.0;
+
 	if(x < self->px) {
 		// If starting new image, clear error accumulator
 		memset(&self->tables[256 * 9], 0, self->height * 3);
@@ -228,19 +426,12 @@ static PyObject *dither(LightPaintObject *self, PyObject *arg) {
 	// Left/right column weightings (1-256)
 	rWeight  = 1 + (int)((x - (double)lCol) * 256.0);
 	lWeight  = 257 - rWeight;
-	ledPtr   = ledBuf.buf;              // -> Output data
-	leftPtr  = &self->pixels[lCol * 3]; // -> Left column input
-	rightPtr = &self->pixels[rCol * 3]; // -> Right column input
-	rowInc   = self->width * 3;
-
-	if(self->vFlip) {
-		leftPtr  += rowInc * (self->height - 1);
-		rightPtr += rowInc * (self->height - 1);
-		rowInc   *= -1;
-	}
+	// Columns are contiguous and already in strip order (see LightPaint_new)
+	leftPtr  = &self->pixels[lCol * self->height * 3]; // -> Left column
+	rightPtr = &self->pixels[rCol * self->height * 3]; // -> Right column
 
 	for(y = self->height; y--; ) {
-		ledPtr[0] = 0xFF; // DotStar pixel header
+		ledPtr[0] = self->header; // DotStar pixel header
 
 		// Interpolate left/right column red values
 		n = (leftPtr[0] * lWeight + rightPtr[0] * rWeight) >> 8;
@@ -275,26 +466,158 @@ static PyObject *dither(LightPaintObject *self, PyObject *arg) {
 		}
 		*ePtr++ = e;
 
-		leftPtr  += rowInc; // Advance 1 row in src image
-		rightPtr += rowInc;
+		leftPtr  += 3; // Advance 1 row in src image
+		rightPtr += 3;
 		ledPtr   += 4;      // Advance 1 pixel in dest buffer
 	}
+}
+
+// Python method: dither(ledBuf, x).  Renders column at x (0.0 to 1.0)
+// into ledBuf, a strip-ready buffer.  The GIL is released while rendering,
+// so another thread can be sending the previous column to the strip.
+static PyObject *dither(LightPaintObject *self, PyObject *arg) {
+	Py_buffer ledBuf;
+	double    x;
 
+	if(!PyArg_ParseTuple(arg, "s*d", &ledBuf, &x)) return NULL;
+	Py_BEGIN_ALLOW_THREADS
+	ditherColumn(self, ledBuf.buf, x);
+	Py_END_ALLOW_THREADS
 	PyBuffer_Release(&ledBuf);
 	Py_INCREF(Py_None);
 	return Py_None;
 }
 
-static void LightPaint_dealloc(LightPaintObject *self) {
-	if(self->tables) {
-		free(self->tables);
-		PyBuffer_Release(&self->pixelBuf);
+// Render a whole sweep ahead of time: returns a bytearray of numFrames
+// strip-ready frames (height * 4 bytes each), frame i being the column at
+// i / (numFrames - 1), dithered in order as a live sweep would be.  A
+// paint loop can then just pick a frame by elapsed time and show() it.
+// numFrames must be at least 1 (ValueError otherwise).
+static PyObject *renderSweep(LightPaintObject *self, PyObject *arg) {
+	uint32_t  numFrames, i, frameSize = self->height * 4;
+	PyObject *result;
+	uint8_t  *ptr;
+
+	if(!PyArg_ParseTuple(arg, "I", &numFrames)) return NULL;
+	if(numFrames < 1) {
+		PyErr_SetString(PyExc_ValueError,
+		  "renderSweep: need at least 1 frame");
+		return NULL;
+	}
+	if(!(result = PyByteArray_FromStringAndSize(NULL,
+	  (Py_ssize_t)numFrames * frameSize))) return NULL;
+	ptr = (uint8_t *)PyByteArray_AsString(result);
+
+	self->px = 2.0; // Start of a new sweep, clears error accumulator
+	Py_BEGIN_ALLOW_THREADS
+	for(i=0; i<numFrames; i++, ptr += frameSize) {
+		ditherColumn(self, ptr, (numFrames > 1) ?
+		  (double)i / (double)(numFrames - 1) : 0.0);
 	}
+	Py_END_ALLOW_THREADS
+	return result;
+}
+
+// Render many columns in one call into consecutive strip-ready frames of
+// 'out' (a writable buffer of at least count * height * 4 bytes).  Either:
+// x.ditherMany(out, positions)    Sequence of x values (0.0 to 1.0)
+// x.ditherMany(out, start=a, stop=b, count=n)
+//                                 n evenly spaced x values from a to b
+//                                 inclusive (a, b default to 0.0, 1.0)
+// Dither error carries from column to column just like repeated dither()
+// calls (and is cleared whenever x goes backward).  The GIL is released
+// while rendering, so another thread can be sending frames to the strip
+// meanwhile...but don't call into the same LightPaint object from two
+// threads at once.
+static PyObject *ditherMany(LightPaintObject *self, PyObject *arg,
+  PyObject *kw) {
+	static char *kwlist[] = {
+	  "out", "positions", "start", "stop", "count", NULL };
+	Py_buffer   out;
+	PyObject   *positions = NULL, *seq;
+	double      start = 0.0, stop = 1.0, *x = NULL;
+	uint32_t    count = 0, i, frameSize = self->height * 4;
+	uint8_t    *ptr;
+
+	if(!PyArg_ParseTupleAndKeywords(arg, kw, "w*|OddI", kwlist,
+	  &out, &positions, &start, &stop, &count)) return NULL;
+
+	if(positions && (positions != Py_None)) {
+		// Copy x values to a C array before releasing the GIL
+		if(!(seq = PySequence_Fast(positions,
+		  "positions must be a sequence"))) goto fail;
+		count = PySequence_Fast_GET_SIZE(seq);
+		if(!(x = (double *)malloc((count + 1) * sizeof(double)))) {
+			Py_DECREF(seq);
+			PyErr_NoMemory();
+			goto fail;
+		}
+		for(i=0; i<count; i++) {
+			x[i] = PyFloat_AsDouble(PySequence_Fast_GET_ITEM(seq, i));
+		}
+		Py_DECREF(seq);
+		if(PyErr_Occurred()) goto fail;
+	}
+
+	if((Py_ssize_t)count * frameSize > out.len) {
+		PyErr_SetString(PyExc_ValueError, "out: buffer too small");
+		goto fail;
+	}
+
+	ptr = out.buf;
+	Py_BEGIN_ALLOW_THREADS
+	for(i=0; i<count; i++, ptr += frameSize) {
+		ditherColumn(self, ptr, x ? x[i] : (count > 1) ?
+		  start + (stop - start) * (double)i / (double)(count - 1) :
+		  start);
+	}
+	Py_END_ALLOW_THREADS
+
+	free(x);
+	PyBuffer_Release(&out);
+	Py_INCREF(Py_None);
+	return Py_None;
+
+  fail:
+	free(x);
+	PyBuffer_Release(&out);
+	return NULL;
+}
+
+// Return the estimated (average, peak) current in milliamps over all image
+// columns at the given color balance, before the power settings are applied.
+static PyObject *estimateCurrent(LightPaintObject *self) {
+	double avg, peak;
+	if(estimate(self, &avg, &peak)) return PyErr_NoMemory();
+	return Py_BuildValue("(dd)", avg, peak);
+}
+
+// Return the computed dither tables as a string, which can be saved and
+// passed back to the constructor ("tables=...") to skip recomputing them.
+// The last byte is the pixel header (global brightness level) to use.
+static PyObject *getTables(LightPaintObject *self) {
+	PyObject *result;
+	if((result = PyString_FromStringAndSize(NULL, TABLES_SIZE))) {
+		memcpy(PyString_AS_STRING(result), self->tables, 256 * 9);
+		PyString_AS_STRING(result)[256 * 9] = self->header;
+	}
+	return result;
+}
+
+static void LightPaint_dealloc(LightPaintObject *self) {
+	if(self->tables) free(self->tables);
+	if(self->pixelBuf.buf)  PyBuffer_Release(&self->pixelBuf);
+	else if(self->pixels)   free(self->pixels);
 	self->ob_type->tp_free((PyObject *)self);
 }
 
 static PyMethodDef methods[] = {
-  { "dither", (PyCFunction)dither, METH_VARARGS, NULL },
+  { "dither"   , (PyCFunction)dither   , METH_VARARGS, NULL },
+  { "getTables", (PyCFunction)getTables, METH_NOARGS , NULL },
+  { "renderSweep", (PyCFunction)renderSweep, METH_VARARGS, NULL },
+  { "ditherMany" , (PyCFunction)ditherMany , METH_VARARGS | METH_KEYWORDS,
+    NULL },
+  { "estimateCurrent", (PyCFunction)estimateCurrent, METH_NOARGS, NULL },
   { NULL, NULL, 0, NULL }
 };
 
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of processed images
+
+Decoding and resizing an image and computing its LightPaint tables takes seconds on a Pi, and the result
+only depends on the file and the painter settings.  PaintCache saves the resized RGB pixels and the tables
+(from LightPaint.getTables()) so a later load can mmap the pixels and skip the work.
+
+The pixels are stored the way LightPaint works on them: column-major, each column already in strip order
+(flipped for vflip), so LightPaint(..., layout='columns') uses the mmap in place instead of copying it.
+convert() writes them a chunk of columns at a time, converting and resizing each chunk on its own, so the
+full-size copies that converting, resizing, tostring() and LightPaint's own copy used to make are gone.
+PIL still decodes the whole source image (in its own mode, so a paletted or greyscale image stays at a
+byte per pixel) the first time a chunk is cropped from it; that one decoded image is what a load costs.
+Painting then only needs the columns being painted resident, paged in from the file as needed.
+
+Entries are keyed by a hash of the file contents plus the settings (gamma, color balance, power settings,
+strip length, color order, vflip, global brightness) and FORMAT, so changing any of them or editing the image
+just makes a new entry.
+Each entry is two files: <key>.col (raw pixels, by column) and <key>.tab (width, height and the tables).
+The directory is kept under a size limit by trim(), run on startup and after each new entry: least recently
+used entries go first (get() touches the .tab), and files that aren't part of a complete entry (a .col or
+.tab without the other, such as the .tab of an old format <key>.rgb, or a .tmp left by a crash) are deleted
+once they're a few minutes old.
+
+Usage:
+    cache = PaintCache('/var/cache/lightpaint', 256 * 1024 * 1024, gamma, color_balance, power_settings,
+      num_leds, order, vflip, global_brightness)
+    key = cache.key(filepath)
+    entry = cache.get(key)          #(pixels, size, tables) or None
+    ...else...
+    pixels, size = cache.convert(key, Image.open(filepath), num_leds, vflip == 'true')
+    lightpaint = LightPaint(pixels, size, ..., layout='columns')
+    cache.put(key, size, lightpaint.getTables())
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import time
+from PIL import Image
+
+FORMAT = 2                  #on-disk layout, part of every key (1 was row-major <key>.rgb pixels)
+TABLES_SIZE = 256 * 9 + 1   #bytes returned by LightPaint.getTables() (tables + pixel header)
+HEADER = struct.Struct('<II')   #width, height in front of the tables
+CHUNK = 256                     #columns converted at a time
+STALE = 600                 #seconds before trim() deletes a file that isn't part of a complete entry
+
+
+def writeColumns(f, img, height, vflip):
+    """
+    Write PIL image 'img' to file 'f' as RGB, resized to 'height' rows (width is kept, see the painter),
+    one column after another, each top to bottom, or bottom to top if 'vflip'
+    """
+    width, imgHeight = img.size
+    for x in range(0, width, CHUNK):
+        cols = img.crop((x, 0, min(x + CHUNK, width), imgHeight)).convert('RGB')
+        if imgHeight != height:
+            cols = cols.resize((cols.size[0], height), Image.BICUBIC)   #rows only, so chunks don't show
+        #turn the columns into rows: a 90 degree turn plus a flip is a transpose, and the turn the
+        #other way is one with each column reversed
+        if vflip:
+            cols = cols.transpose(Image.ROTATE_270)
+        else:
+            cols = cols.transpose(Image.ROTATE_90).transpose(Image.FLIP_TOP_BOTTOM)
+        f.write(cols.tobytes() if hasattr(cols, 'tobytes') else cols.tostring())
+
+
+class PaintCache():
+    """
+    Disk cache of resized pixels + dither tables for one set of painter settings
+    'maxBytes' is the most disk space the entries may take (see trim())
+    Any problem reading or writing the cache (missing directory, no permission, truncated files)
+    just means a cache miss, so painting never depends on it
+    """
+    def __init__(self, cacheDir, maxBytes, *settings):
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        self.settings = repr((FORMAT,) + settings).encode()
+        try:
+            if not os.path.isdir(cacheDir): os.makedirs(cacheDir)
+        except OSError as e:
+            print ("Image cache disabled: %s" % e)
+            self.cacheDir = None
+        self.trim()
+
+    def key(self, filepath):
+        h = hashlib.sha1(self.settings)
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def get(self, key):
+        """
+        Return (pixels, (width, height), tables) for a cached image, else None
+        pixels is a read-only mmap of the column store, so it costs no memory until it's read
+        """
+        if self.cacheDir is None: return None
+        base = os.path.join(self.cacheDir, key)
+        try:
+            with open(base + '.tab', 'rb') as f:
+                data = f.read()
+            width, height = HEADER.unpack_from(data)
+            tables = data[HEADER.size:]
+            with open(base + '.col', 'rb') as f:
+                pixels = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError, ValueError, struct.error):
+            return None
+        if len(tables) != TABLES_SIZE or len(pixels) != width * height * 3:
+            pixels.close()
+            return None
+        try:
+            os.utime(base + '.tab', None)   #recently used, see trim()
+        except OSError:
+            pass
+        return pixels, (width, height), tables
+
+    def convert(self, key, img, height, vflip):
+        """
+        Store PIL image 'img' as the pixels for 'key' (see writeColumns()) and return (pixels, (width, height)),
+        pixels being a read-only mmap of them.  Without a cache directory, or if writing to it fails, they go
+        to a temporary file instead, which is deleted once the mmap is closed.
+        put() the tables once they're made, to complete the entry
+        """
+        size = (img.size[0], height)
+        if self.cacheDir is not None:
+            path = os.path.join(self.cacheDir, key + '.col')
+            try:
+                #written to a temp name and renamed, so a partly written file is never seen
+                with open(path + '.tmp', 'wb') as f:
+                    writeColumns(f, img, height, vflip)
+                os.rename(path + '.tmp', path)
+                with open(path, 'rb') as f:
+                    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), size
+            except (IOError, OSError, ValueError) as e:
+                print ("Couldn't cache image: %s" % e)
+        with tempfile.TemporaryFile() as f:
+            writeColumns(f, img, height, vflip)
+            f.flush()
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), size
+
+    def put(self, key, size, tables):
+        """
+        Save the tables for 'key', whose pixels convert() has stored (get() needs both)
+        """
+        if self.cacheDir is None: return
+        base = os.path.join(self.cacheDir, key)
+        try:
+            with open(base + '.tab.tmp', 'wb') as f:
+                f.write(HEADER.pack(size[0], size[1]) + tables)
+            os.rename(base + '.tab.tmp', base + '.tab')
+        except (IOError, OSError) as e:
+            print ("Couldn't cache image: %s" % e)
+        self.trim(keep=key)
+
+    def trim(self, keep=None):
+        """
+        Delete least recently used entries until the rest fit in maxBytes, and files that aren't part of a
+        complete entry once they're STALE (younger ones may still be being written, by another thread)
+        'keep' is a key not to delete, the entry just made.  A deleted entry that's still mapped stays
+        readable until it's unmapped
+        """
+        if self.cacheDir is None: return
+        try:
+            names = os.listdir(self.cacheDir)
+        except OSError:
+            return
+        now = time.time()
+        entries = {}    #key -> [last used, bytes, {extension: path}]
+        for name in names:
+            key, ext = os.path.splitext(name)
+            path = os.path.join(self.cacheDir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue    #deleted meanwhile
+            entry = entries.setdefault(key, [0, 0, {}])
+            entry[0] = max(entry[0], st.st_mtime)
+            entry[1] += st.st_size
+            entry[2][ext] = path
+        complete = []
+        for key, entry in entries.items():
+            if sorted(entry[2]) == ['.col', '.tab']:
+                complete.append((entry[0], entry[1], key))
+            elif key != keep and now - entry[0] > STALE:
+                self._remove(entry[2].values())
+        used = sum(entry[1] for entry in complete)
+        for lastUsed, nbytes, key in sorted(complete):
+            if used <= self.maxBytes: break
+            if key == keep: continue
+            self._remove(entries[key][2].values())
+            used -= nbytes
+
+    def _remove(self, paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass    #gone already, or read-only: it'll be tried again next time
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Double-buffered column output for the painter
+
+Rendering a column (LightPaint.dither()) and sending it to the strip (strip.show()) both release the GIL,
+so they can run on different cores at the same time.  PaintPipeline owns two strip-ready buffers and a
+thread that sends them: while column N is going out over SPI, the caller renders column N+1 into the other
+buffer.  A buffer is only handed back for rendering once its show() has finished, so a frame is never
+changed while it's on the wire.
+
+A whole sweep can also be run on the pipeline's own render thread with paint(), so the caller (the
+painter's event loop) isn't tied up for the length of it.  The sweep renders as above; the caller only
+looks at 'painting' and can stop() it.
+
+Usage:
+    pipeline = PaintPipeline(strip, num_leds)
+    while painting:
+        buf = pipeline.buffer()         #waits for a buffer that isn't being sent
+        lightpaint.dither(buf, x)
+        pipeline.show(buf)              #queued; returns right away
+    pipeline.flush()                    #wait until the last column is out
+or:
+    pipeline.paint(sweep)               #sweep() runs the loop above on the render thread, until
+                                        #it's done or pipeline.stopping is set by stop()
+"""
+
+import threading
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+from frameclock import monotonic
+
+
+class PaintPipeline():
+    """
+    Renders and shows strip frames in parallel
+    'strip' is anything with show(buf); 'depth' is the number of buffers (2 = double buffering)
+    'shown' counts frames sent, so columns/sec = shown / elapsed (see rate())
+    """
+    def __init__(self, strip, numLEDs, depth=2):
+        self.strip = strip
+        self.free = Queue()     #buffers ready to render into
+        self.ready = Queue()    #rendered buffers waiting to be shown, in order
+        for i in range(depth):
+            self.free.put(bytearray([0xFF, 0, 0, 0] * numLEDs))
+        self.shown = 0
+        self.startTime = monotonic()
+        self.worker = threading.Thread(target=self._run)
+        self.worker.daemon = True   #don't hold up exit
+        self.worker.start()
+        self.sweeps = Queue()       #(sweep, args) for the render thread
+        self.idle = threading.Event()
+        self.idle.set()
+        self.painting = False       #a sweep from paint() hasn't finished yet
+        self.stopping = False       #stop() was called, the sweep should return
+        self.renderer = threading.Thread(target=self._render)
+        self.renderer.daemon = True
+        self.renderer.start()
+
+    def buffer(self):
+        """
+        Get a buffer to render the next frame into (blocks while all of them are queued or being sent)
+        """
+        return self.free.get()
+
+    def show(self, buf):
+        """
+        Queue a buffer from buffer() to be sent to the strip; it is returned to the free pool once sent
+        """
+        self.ready.put(buf)
+
+    def flush(self):
+        """
+        Wait until every queued frame has been sent
+        """
+        self.ready.join()
+
+    def paint(self, sweep, *args):
+        """
+        Run sweep(*args) on the render thread and return right away (only while not 'painting')
+        'painting' is set until the sweep has returned and its frames are all out
+        """
+        self.stopping = False
+        self.painting = True
+        self.idle.clear()
+        self.sweeps.put((sweep, args))
+
+    def stop(self):
+        """
+        Have the sweep being painted return (by setting 'stopping'), and wait until it has
+        """
+        self.stopping = True
+        self.idle.wait()
+
+    def reset(self):
+        """
+        Restart the columns/sec count
+        """
+        self.flush()
+        self.shown = 0
+        self.startTime = monotonic()
+
+    def rate(self):
+        """
+        Frames (columns) sent per second since the last reset()
+        """
+        elapsed = monotonic() - self.startTime
+        return self.shown / elapsed if elapsed > 0 else 0.0
+
+    def _run(self):
+        while True:
+            buf = self.ready.get()
+            try:
+                self.strip.show(buf)
+                self.shown += 1
+            except Exception as e:
+                print ("Strip write failed: %s" % e)
+            self.free.put(buf)
+            self.ready.task_done()
+
+    def _render(self):
+        while True:
+            sweep, args = self.sweeps.get()
+            try:
+                sweep(*args)
+            except Exception as e:
+                print ("Paint sweep failed: %s" % e)
+            self.flush()
+            self.painting = False
+            self.idle.set()
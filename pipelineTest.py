@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Columns/sec of the paint loop: dither() then show() one after the other, vs PaintPipeline
+
+Needs the lightpaint module built (make).  On the Pi it drives the real strip; anywhere else (or with
+'fake' on the command line) the strip is simulated by sleeping for the time the SPI transfer would take,
+which like the real show() lets other threads run.
+"""
+
+import os
+import sys
+import time
+from lightpaint import LightPaint
+from pipeline import PaintPipeline
+from stripbackend import MemoryStrip
+
+numLEDs = 144
+bitrate = 12000000
+numCols = 5000      #columns per test
+width   = 1000
+
+if 'fake' in sys.argv[1:] or not os.path.exists('/dev/spidev0.0'):
+    strip = MemoryStrip(numLEDs, bitrate, maxFrames=1, realtime=True)
+    print ("Simulated strip at %d Hz" % bitrate)
+else:
+    from dotstar import Adafruit_DotStar
+    strip = Adafruit_DotStar(numLEDs, bitrate, order='brg')
+    strip.begin()
+
+pixels = os.urandom(width * numLEDs * 3)
+lightpaint = LightPaint(pixels, (width, numLEDs), (2.8, 2.8, 2.8),
+  (128, 255, 180), (1450, 1550), order='brg', vflip='true')
+
+ledBuf = bytearray(numLEDs * 4)
+startTime = time.time()
+for i in range(numCols):
+    lightpaint.dither(ledBuf, float(i) / (numCols - 1))
+    strip.show(ledBuf)
+elapsed = time.time() - startTime
+print ("dither + show:  %8.0f columns/sec" % (numCols / elapsed))
+
+pipeline = PaintPipeline(strip, numLEDs)
+startTime = time.time()
+for i in range(numCols):
+    buf = pipeline.buffer()
+    lightpaint.dither(buf, float(i) / (numCols - 1))
+    pipeline.show(buf)
+pipeline.flush()
+elapsed = time.time() - startTime
+print ("PaintPipeline:  %8.0f columns/sec" % (numCols / elapsed))
+
+if not isinstance(strip, MemoryStrip):
+    #dotstar.c's own queue and writer thread, no python thread involved
+    startTime = time.time()
+    for i in range(numCols):
+        lightpaint.dither(ledBuf, float(i) / (numCols - 1))
+        strip.showAsync(ledBuf)
+    strip.wait()
+    elapsed = time.time() - startTime
+    print ("showAsync:      %8.0f columns/sec, %d underruns" % (numCols / elapsed, strip.getQueueStats()[1]))
+    strip.show(bytearray([0xFF, 0, 0, 0] * numLEDs))
+
+
+#learnings:
+# on a single core x86 VM with the simulated strip, python 2.7, 144 LEDs:
+#  dither + show: ~1860 columns/sec, PaintPipeline: ~1810 columns/sec
+# dither() is ~5us there against ~400us on the wire, so there's nothing to overlap and the thread
+# handoff costs a little.  The pipeline pays off where dither() is a real fraction of the frame time
+# and there's a second core, ie: on a Pi 2/3
@@ -13,9 +13,8 @@ TODO
 
 """
 
-#import math
+import math
 import numpy as np
-from scipy.stats import norm
 from collections import namedtuple
 
 ColorT = namedtuple('ColorT', ['r', 'g', 'b'])
@@ -30,21 +29,61 @@ class Color(ColorT):
     def __add__(self, other):
         return Color(*([self.clamp(sum(x)) for x in zip(self, other)]))
         
+_kernelCache = {}   #normalized gaussian kernels, shared by all pulses
+def gaussKernel(width, extent, phase, phases):
+    """
+    Gaussian of sigma 'width' sampled at -extent..+extent, with the center shifted right by phase/phases of a pixel
+    Peak is normalized to 1 (same shape as makePulseFast).  Kernels are computed once and cached
+    """
+    key = (width, extent, phase, phases)
+    kernel = _kernelCache.get(key)
+    if kernel is None:
+        x = np.arange(-extent, extent + 1) - float(phase) / phases
+        kernel = np.exp(-np.power(x, 2.) / (2 * np.power(width, 2.)))
+        _kernelCache[key] = kernel
+    return kernel
+
 class PulseCtl():
     """
     A class to hold control and current status (eg: location) of a Guassian shape
     Has notion of size of array to be rendered onto and can be updated to shift over time
+    'phases' is how many sub-pixel center positions get their own precomputed kernel
     """
-    def __init__(self, arrayLen, startCtr, width, rate, color):
+    def __init__(self, arrayLen, startCtr, width, rate, color, phases=16):
         self.arrayLen = arrayLen
         self.startCtr = startCtr
         self.width = width
-        self.rate = rate    #how much to shift the pulse per update 
+        self.rate = rate    #how much to shift the pulse per update (LEDs per frame)
         self.color = color  #Color class
         self.currCtr = startCtr
         self.border = width*3   #how far to let the center be from the display before restarting
-    def update(self):
-        self.currCtr = self.currCtr + self.rate
+        self.phases = phases
+        self.kernels = {}   #color-scaled kernels, keyed by (width, color, phase, scale)
+    def window(self, scale=1):
+        """
+        Return (start, kernel) for the current center: kernel is a (K,3) uint16 array of r,g,b
+        covering the +/-3 sigma region, to be added to the display starting at index 'start'
+        'scale' multiplies the values before they are made integers, eg: 256 for 8.8 fixed point
+        """
+        extent = int(math.ceil(self.width * 3))
+        base = math.floor(self.currCtr)
+        phase = int(round((self.currCtr - base) * self.phases))
+        if phase == self.phases:    #rounded up to the next whole pixel
+            base += 1
+            phase = 0
+        key = (self.width, self.color, phase, scale)
+        kernel = self.kernels.get(key)
+        if kernel is None:
+            pdf = gaussKernel(self.width, extent, phase, self.phases)
+            kernel = np.minimum(pdf[:, np.newaxis] * np.array(self.color, dtype=float) * scale, 65535).astype(np.uint16)
+            self.kernels[key] = kernel
+        return int(base) - extent, kernel
+    def update(self, steps=1):
+        """
+        Shift the pulse by 'steps' updates' worth of rate; steps can be fractional
+        (eg: elapsed seconds * frame rate, to move at rate*frameRate LEDs per second regardless of rendering speed)
+        """
+        self.currCtr = self.currCtr + self.rate * steps
         #once it moves past the display, move it to the other side (offset by border)
         if self.currCtr > self.arrayLen + self.border:
             self.currCtr = -self.border
@@ -67,6 +106,74 @@ class ColorList(list):
         if type(other) == int: return self    #this is to support sum, which starts by adding to '0'
         return other + self
 
+# blend modes for Compositor
+ADD = 'add'         #saturating sum (what ColorList '+' does)
+MAX = 'max'         #brightest of the two
+SCREEN = 'screen'   #1-(1-a)(1-b): brightens like add but never clips
+OVER = 'over'       #alpha-over: layer drawn on top with the given alpha (0-255)
+
+class Compositor():
+    """
+    Combines layers of r,g,b values into one frame with integer math
+    Layers accumulate into one uint16 array (adds saturate at 65535) and are clamped to [0-255] once, by result()
+    Layers may cover only part of the display, starting at 'start' (eg: a pulse's window)
+    The accumulator is allocated once, so reuse a Compositor across frames
+    """
+    def __init__(self, numLEDs):
+        self.numLEDs = numLEDs
+        self.acc = np.zeros((numLEDs, 3), dtype=np.uint16)
+        self.out = np.zeros((numLEDs, 3), dtype=np.uint8)
+    def clear(self):
+        self.acc[:] = 0
+    def add(self, layer, start=0, mode=ADD, alpha=255):
+        """
+        Blend an (K,3) layer into the accumulator at [start, start+K), clipped to the display
+        'alpha' is only used by OVER; it can be a number or a per-LED (K,) array
+        """
+        layer = np.asarray(layer)
+        if layer.dtype != np.uint16: layer = np.clip(layer, 0, 65535).astype(np.uint16)
+        lo = max(start, 0)
+        hi = min(start + len(layer), self.numLEDs)
+        if lo >= hi: return     #entirely off the display
+        layer = layer[lo - start:hi - start]
+        acc = self.acc[lo:hi]
+        if mode == ADD:
+            np.minimum(acc, 65535 - layer, out=acc)    #saturate rather than wrap
+            acc += layer
+        elif mode == MAX:
+            np.maximum(acc, layer, out=acc)
+        else:
+            np.minimum(acc, 255, out=acc)   #these modes work on [0-255] values, so clamp what is there so far
+            a = acc.astype(np.uint32)
+            b = np.minimum(layer, 255).astype(np.uint32)
+            if mode == SCREEN:
+                acc[:] = a + b - (a * b + 127) // 255
+            elif mode == OVER:
+                alpha = np.asarray(alpha, dtype=np.uint32)
+                if alpha.ndim == 1: alpha = alpha[:, np.newaxis]  #one alpha per LED
+                acc[:] = (b * alpha + a * (255 - alpha) + 127) // 255
+            else:
+                raise ValueError("unknown blend mode: %r" % (mode,))
+    def result(self):
+        """
+        Clamp the accumulator to [0-255]; returns an (numLEDs, 3) uint8 array (reused on the next call)
+        """
+        np.minimum(self.acc, 255, out=self.acc)
+        self.out[:] = self.acc
+        return self.out
+
+def composite(layers, mode=ADD):
+    """
+    Combine a list of full-length layers (ColorLists or (N,3) arrays) into one (N,3) uint8 array
+    With the default mode this is a drop-in for sum(colorArrays)
+    """
+    first = np.asarray(layers[0])
+    comp = Compositor(len(first))
+    comp.acc[:] = first
+    for layer in layers[1:]:
+        comp.add(layer, mode=mode)
+    return comp.result().copy()
+
 def makePulseFast(pulse):	
 	"""
 	Generate a ColorList given a PulseCtl
@@ -86,10 +193,11 @@ def makePulse(pulse):
     Generate a ColorList given a PulseCtl
     """
     #fill array with normal distrib, offset as appropriate
-    rv = norm(loc = pulse.currCtr, scale = pulse.width)
-    x = range(0, pulse.arrayLen)
-    maxPdf = rv.pdf(pulse.currCtr)  #use max value to normalize the height of the pdf
-    pdf = [rv.pdf(xx)/maxPdf for xx in x]   #generate a pdf with normalized height 
+    #this is scipy's norm(loc=currCtr, scale=width).pdf(x) divided by its max (the pdf at the center),
+    #written out so the module doesn't pay for importing scipy.stats
+    x = np.arange(0, pulse.arrayLen)
+    y = (x - pulse.currCtr) / float(pulse.width)
+    pdf = np.exp(-y*y / 2.0)   #generate a pdf with normalized height 
     
     #scale the color by the gaussian pulse and build into array of colors
     # if we wanted to handle 'tight' wrapping, we could see if the center was within 2 sigma of an edge
@@ -105,4 +213,109 @@ def byteArray(colorList):
     blu = lambda clr: clr.b
     flatArray = bytearray([f(x) for x in colorList for f in (alpha, blu, grn, red)])  #create a flat list that is alpha, grn, blu, red
     return flatArray
-    
+
+def renderPulses(pulseList, arrayLen=None, compositor=None, wide=False):
+    """
+    Render all the pulses in one go, without building a Color per pixel
+    Returns an (arrayLen, 3) uint8 array of r,g,b
+    Each pulse only adds its cached +/-3 sigma kernel (see PulseCtl.window), so the cost
+    scales with pulse width rather than strip length.  Clamping is done once at the end
+    Pass a Compositor to reuse its buffers from frame to frame (the result is then its .out array)
+    The strip length is taken from the first pulse unless 'arrayLen' or 'compositor' gives it
+    With 'wide' the result is instead a uint16 array in 8.8 fixed point (256 = one 8-bit level), keeping
+    the fractions that dim tails would lose; feed it to a TemporalDither (it is the compositor's .acc array)
+    """
+    if compositor is None:
+        if arrayLen is None:
+            if not pulseList: raise ValueError("renderPulses: no pulses, so pass arrayLen or a compositor")
+            arrayLen = pulseList[0].arrayLen
+        compositor = Compositor(arrayLen)
+    compositor.clear()
+    scale = 256 if wide else 1
+    for pulse in pulseList:
+        start, kernel = pulse.window(scale)
+        compositor.add(kernel, start)
+    if wide: return compositor.acc     #adds saturate at 65535, ie: clamp at ~255.996
+    return compositor.result()
+
+def stripBytes(frame):
+    """
+    Convert an (N,3) r,g,b array (eg: from renderPulses) to the alpha, blu, grn, red bytearray that byteArray makes
+    """
+    flat = np.empty((len(frame), 4), dtype=np.uint8)
+    flat[:, 0] = 0xFF
+    flat[:, 1:] = frame[:, ::-1]   #r,g,b -> b,g,r
+    return bytearray(flat.tobytes())
+
+class FrameBuffer():
+    """
+    Strip-ready frame that is allocated once and rewritten in place every frame
+    Holds numLEDs*4 bytes: the 0xFF header byte is set once, colors are written through a NumPy view
+    'order' is the strip color order, same meaning as in Adafruit_DotStar and LightPaint (eg: 'brg', 'bgr', 'gbr')
+    Pass .buf to strip.show()
+    """
+    def __init__(self, numLEDs, order='brg'):
+        self.numLEDs = numLEDs
+        self.buf = bytearray([0xFF, 0, 0, 0] * numLEDs)
+        self.pixels = np.frombuffer(self.buf, dtype=np.uint8).reshape(numLEDs, 4)   #view, shares memory with buf
+        order = order.lower()
+        #views of the r,g,b bytes within each 4 byte pixel (offset 0 is the header)
+        self.channels = [self.pixels[:, order.index(c) + 1] for c in 'rgb']
+    def write(self, frame):
+        """
+        Copy an (numLEDs, 3) r,g,b array (eg: from renderPulses) into the buffer
+        """
+        for c in range(3):
+            self.channels[c][:] = frame[:, c]
+        return self.buf
+    def clear(self):
+        for chan in self.channels:
+            chan[:] = 0
+
+
+def gammaTable(gamma, balance):
+    """
+    Lookup table from 8.8 fixed point input levels (0-65535, 255.0 = 65280) to 8.8 fixed point output levels,
+    with gamma correction and color balance ('balance' is the max output, 0-255): the same curve LightPaint
+    builds its dither tables from
+    """
+    level = np.minimum(np.arange(65536, dtype=float) / (255 * 256), 1.0)
+    return np.minimum(np.power(level, gamma) * balance * 256.0 + 0.5, 65535).astype(np.uint16)
+
+class TemporalDither(FrameBuffer):
+    """
+    FrameBuffer that gamma corrects, color balances and dithers over time
+    Each write() maps the frame through 16 bit gamma/balance tables (as LightPaint does for images) and keeps
+    the part below one 8-bit level in a per-LED error accumulator, carrying it into later frames, so a dim
+    or slowly fading value averages out to the right brightness instead of being truncated (banding, or
+    tails that blink between 0 and 1).
+    'gamma' and 'balance' are r,g,b tuples; the defaults leave colors as they are (only dithering)
+    """
+    def __init__(self, numLEDs, gamma=(1.0, 1.0, 1.0), balance=(255, 255, 255), order='brg'):
+        FrameBuffer.__init__(self, numLEDs, order)
+        self.tables = [gammaTable(gamma[c], balance[c]) for c in range(3)]
+        self.err = np.zeros((numLEDs, 3), dtype=np.uint16)    #fraction carried over, in 1/256 of a level
+        self.level = np.zeros((numLEDs, 3), dtype=np.uint16)
+    def write(self, frame):
+        """
+        Dither an (numLEDs, 3) r,g,b frame into the buffer.  Values are levels 0-255: uint8, float,
+        or uint16 in 8.8 fixed point (eg: renderPulses(..., wide=True))
+        """
+        frame = np.asarray(frame)
+        if frame.dtype == np.uint8:
+            frame = frame.astype(np.uint16) << 8
+        elif frame.dtype != np.uint16:
+            frame = np.clip(np.asarray(frame, dtype=float) * 256.0, 0, 65535).astype(np.uint16)
+        for c in range(3):
+            np.take(self.tables[c], frame[:, c], out=self.level[:, c])
+        self.err += self.level & 0xFF       #fraction into the error (< 512, no overflow)
+        self.level >>= 8
+        self.level += self.err >> 8         #whole level's worth of error: one level brighter
+        self.err &= 0xFF
+        np.minimum(self.level, 255, out=self.level)
+        for c in range(3):
+            self.channels[c][:] = self.level[:, c]
+        return self.buf
+    def clear(self):
+        FrameBuffer.clear(self)
+        self.err[:] = 0
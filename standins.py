@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Stand-ins for the Pi's buttons and mouse, so the scripts run headless
+
+RPi.GPIO only imports on a Pi and evdev only on Linux with its C extension built, so with DOTSTAR_BACKEND set
+to anything but spi (a MemoryStrip, see stripbackend.py) the scripts take these instead:
+    GPIO            the RPi.GPIO calls Buttons and the scripts make.  Every pin reads high (not pressed)
+                    until press(pin), and release(pin) lets it go again; both call the pin's edge callback
+                    like a real edge would, so Buttons debounces and queues events as usual
+    InputDevice     an evdev mouse that reports the REL_X motion given to move(dx).  The scripts only look
+                    for one if 'mouse' is set before they start (see mousePresent())
+    ecodes          the evdev event codes used (same values as evdev's)
+headlessTest.py runs the real scripts this way, pressing their buttons from another thread.
+
+Usage:
+    DOTSTAR_BACKEND=memory python DotStarPiPainter.py      #no Pi needed, but nothing presses the buttons
+    ...or, with the script running in this process:
+    standins.GPIO.press(22); time.sleep(2); standins.GPIO.release(22)
+    standins.devices[-1].move(10)       #the stand-in mouse, if there is one
+"""
+
+import errno
+import fcntl
+import os
+from collections import deque
+
+mouse = False       #whether mousePresent() finds a mouse
+devices = []        #InputDevices made, newest last
+
+
+class ecodes():
+    EV_REL = 0x02
+    REL_X = 0x00
+
+
+class StandInGPIO():
+    """
+    The parts of RPi.GPIO used here, with pins that are set by press()/release() instead of read
+    Constants have RPi.GPIO's values
+    """
+    BOARD = 10
+    BCM = 11
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self):
+        self.levels = {}        #pin -> level; pins with pull-ups (all the buttons) rest high
+        self.callbacks = {}     #pin -> edge callback
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, on):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        self.levels.setdefault(pin, self.LOW if pull_up_down == self.PUD_DOWN else self.HIGH)
+
+    def input(self, pin):
+        return self.levels.get(pin, self.HIGH)
+
+    def output(self, pin, level):
+        self.levels[pin] = level
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self.callbacks[pin] = callback
+
+    def remove_event_detect(self, pin):
+        self.callbacks.pop(pin, None)
+
+    def cleanup(self):
+        self.levels.clear()
+        self.callbacks.clear()
+
+    def press(self, pin):
+        self._set(pin, self.LOW)    #buttons connect the pin to ground
+
+    def release(self, pin):
+        self._set(pin, self.HIGH)
+
+    def _set(self, pin, level):
+        #called on the caller's thread, like RPi.GPIO calls callbacks on its own
+        self.levels[pin] = level
+        callback = self.callbacks.get(pin)
+        if callback is not None: callback(pin)
+
+
+GPIO = StandInGPIO()
+
+
+def mousePresent(path):
+    """
+    Stands in for os.path.exists(mousefile): whether there's a (stand-in) mouse is up to 'mouse'
+    """
+    return mouse
+
+
+class InputEvent():
+    def __init__(self, type, code, value):
+        self.type = type
+        self.code = code
+        self.value = value
+
+
+class InputDevice():
+    """
+    Stand-in evdev mouse: fileno() is readable while there's motion from move() to read()
+    """
+    def __init__(self, path):
+        self.path = path
+        self.events = deque()
+        self.readFd, self.writeFd = os.pipe()
+        for fd in (self.readFd, self.writeFd):
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+        devices.append(self)
+
+    def close(self):
+        os.close(self.readFd)
+        os.close(self.writeFd)
+
+    def fileno(self):
+        return self.readFd
+
+    def move(self, dx):
+        self.events.append(InputEvent(ecodes.EV_REL, ecodes.REL_X, dx))
+        try:
+            os.write(self.writeFd, b'x')
+        except OSError:
+            pass    #pipe full: it's readable anyway
+
+    def read(self):
+        """
+        The events waiting; like evdev, EAGAIN if there are none
+        """
+        try:
+            while os.read(self.readFd, 64): pass
+        except OSError:
+            pass
+        events = []
+        while self.events:
+            events.append(self.events.popleft())
+        if not events: raise IOError(errno.EAGAIN, os.strerror(errno.EAGAIN))
+        return events
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Strip backends: the real DotStar strip, or a stand-in that records frames
+
+Adafruit_DotStar (dotstar.c) needs /dev/spidev0.0 or the Pi's GPIO registers, so nothing that draws to it can
+run anywhere else.  MemoryStrip has the same methods (begin, show, showAsync, wait, clear, setBrightness,
+setPixelColor, setPixels, fill, getPixelColor, getPixels, numPixels, close...) but instead of sending each
+frame it records it, with a monotonic timestamp, in memory and/or to a file.  That lets the render loops run
+headless on any Linux box, to profile them or to check what they draw and when.
+
+openStrip() is what the scripts call; the DOTSTAR_BACKEND environment variable picks the backend:
+    spi (or unset)      the real strip
+    memory              MemoryStrip, keeping the most recent frames in memory
+    file:<path>         MemoryStrip, also appending every frame to <path> (read back with readRecording())
+DOTSTAR_REALTIME=1 makes a MemoryStrip's show() take as long as the SPI transfer would.  headless() says
+whether the backend isn't the real strip; the scripts then use the stand-in buttons and mouse in
+standins.py too, since there's no Pi for RPi.GPIO either.
+
+Usage:
+    strip = openStrip(num_leds, 12000000, order='brg')
+    ...
+    DOTSTAR_BACKEND=file:/tmp/frames.rec python PersistenceOfVisionSoothe.py
+    for t, frame in readRecording('/tmp/frames.rec'): ...
+
+loadBitrate()/saveBitrate() keep the strip's max safe SPI rate, as found by calibrate.py.
+"""
+
+import os
+import struct
+import time
+from collections import deque
+from frameclock import monotonic
+
+RECORD = struct.Struct('<dI')   #timestamp, frame length in front of each frame in a recording
+
+
+class MemoryStrip():
+    """
+    Stand-in for Adafruit_DotStar that records frames instead of sending them
+    Each show() appends (timestamp, bytes) to self.frames (the last 'maxFrames' are kept) and, if 'sink' is
+    a path, to that file.  Frames are strip-ready, 4 bytes per LED (0xFF, then the colors in 'order'),
+    exactly what the real strip would have been sent between header and footer.
+    With 'realtime' set, show() also takes as long as the SPI transfer at 'bitrate' would.
+    Like dotstar.c, a frame identical to the last one is skipped (not recorded) unless a second has passed,
+    see setSkipRepeats().
+    """
+    def __init__(self, numLEDs=0, bitrate=8000000, order='brg', sink=None, maxFrames=10000, realtime=False):
+        self.numLEDs = numLEDs
+        self.bitrate = bitrate
+        order = order.lower()
+        self.rOffset = order.index('r') + 1
+        self.gOffset = order.index('g') + 1
+        self.bOffset = order.index('b') + 1
+        self.pixels = bytearray([0xFF, 0, 0, 0] * numLEDs)
+        self.brightness = 0     #stored +1 like dotstar.c: 0 means full, no scaling
+        self.frames = deque(maxlen=maxFrames)
+        self.count = 0          #frames sent (recorded) in total
+        self.skipped = 0        #frames skipped as repeats of the last one
+        self.skipRepeats = True
+        self.refresh = 1.0
+        self.last = None        #last frame sent
+        self.lastTime = 0.0
+        self.sinkPath = sink
+        self.sink = None
+        self.realtime = realtime
+
+    def begin(self):
+        self.last = None
+        if self.sinkPath and self.sink is None:
+            self.sink = open(self.sinkPath, 'ab')
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
+            self.sink = None
+
+    def clear(self):
+        for i in range(self.numLEDs):
+            self.pixels[i * 4 + 1:i * 4 + 4] = b'\0\0\0'
+
+    def setBrightness(self, b):
+        self.brightness = (b + 1) & 0xFF
+
+    def getBrightness(self):
+        return (self.brightness - 1) & 0xFF
+
+    def setGlobalBrightness(self, level):
+        for i in range(self.numLEDs):
+            self.pixels[i * 4] = 0xE0 | min(level, 31)
+
+    def getGlobalBrightness(self):
+        return self.pixels[0] & 0x1F if self.numLEDs else 31
+
+    def setBitrate(self, bitrate):
+        self.bitrate = bitrate
+
+    def getBitrate(self):
+        return self.bitrate
+
+    def setPixelColor(self, i, *color):
+        if len(color) == 1:
+            v = color[0]
+            r, g, b = (v >> 16) & 0xFF, (v >> 8) & 0xFF, v & 0xFF
+        else:
+            r, g, b = color
+        if 0 <= i < self.numLEDs:
+            self.pixels[i * 4 + self.rOffset] = r
+            self.pixels[i * 4 + self.gOffset] = g
+            self.pixels[i * 4 + self.bOffset] = b
+
+    def setPixels(self, start, colors):
+        #RGB triples, or packed 0x00RRGGBB if 'colors' has 4 byte items (same rule as dotstar.c)
+        try:
+            raw = bytearray(memoryview(colors).tobytes())
+        except TypeError:
+            raw = bytearray(buffer(colors))    #python 2 array.array has only the old buffer interface
+        if getattr(colors, 'itemsize', 1) == 4:
+            values = struct.unpack('=%dI' % (len(raw) // 4), bytes(raw[:len(raw) // 4 * 4]))
+        else:
+            values = [(raw[i] << 16) | (raw[i + 1] << 8) | raw[i + 2] for i in range(0, len(raw) - 2, 3)]
+        for i, v in enumerate(values[:max(self.numLEDs - start, 0)]):
+            self.setPixelColor(start + i, v)
+
+    def fill(self, start, end, *color):
+        for i in range(start, min(end, self.numLEDs)):
+            self.setPixelColor(i, *color)
+
+    def getPixelColor(self, i):
+        if not 0 <= i < self.numLEDs: return 0
+        p = self.pixels
+        return (p[i * 4 + self.rOffset] << 16) | (p[i * 4 + self.gOffset] << 8) | p[i * 4 + self.bOffset]
+
+    def Color(self, r, g, b):
+        return (r << 16) | (g << 8) | b
+
+    def numPixels(self):
+        return self.numLEDs
+
+    def getPixels(self):
+        return memoryview(self.pixels)
+
+    def show(self, buf=None):
+        """
+        Record a frame: 'buf' as given (raw, no brightness scaling, like the real show()),
+        else the pixel buffer scaled by the brightness setting
+        """
+        if buf is not None:
+            frame = bytes(buf)
+        elif self.brightness == 0:
+            frame = bytes(self.pixels)
+        else:
+            scale = self.brightness
+            frame = bytearray(self.pixels)
+            for i in range(len(frame)):
+                if i % 4: frame[i] = (frame[i] * scale) >> 8   #not the header bytes
+            frame = bytes(frame)
+        t = monotonic()
+        if self.skipRepeats and frame == self.last and (self.refresh <= 0 or t - self.lastTime < self.refresh):
+            self.skipped += 1
+            return
+        self.last, self.lastTime = frame, t
+        if self.realtime:
+            numLEDs = self.numLEDs or len(frame) // 4
+            time.sleep((4 + len(frame) + (numLEDs + 15) // 16) * 8.0 / self.bitrate)
+        t = monotonic()
+        self.frames.append((t, frame))
+        self.count += 1
+        if self.sink is not None:
+            self.sink.write(RECORD.pack(t, len(frame)) + frame)
+
+    def showAsync(self, buf=None):
+        #no transfer to overlap with, so this is just show(); the queue is never used
+        self.show(buf)
+
+    def wait(self):
+        pass
+
+    def getQueueStats(self):
+        return (0, 0, self.count + self.skipped)
+
+    def setSkipRepeats(self, on, refresh=1.0):
+        self.skipRepeats = bool(on)
+        self.refresh = refresh
+        self.last = None
+
+    def getFrameStats(self):
+        return (self.count, self.skipped)
+
+
+def readRecording(path):
+    """
+    Yield (timestamp, frame) for each frame in a file written by MemoryStrip
+    """
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size: return
+            t, n = RECORD.unpack(header)
+            frame = f.read(n)
+            if len(frame) < n: return   #cut short, eg: recorder was killed mid-write
+            yield t, frame
+
+
+def loadBitrate(path, default):
+    """
+    SPI bitrate saved by calibrate.py, or 'default' if there's none (or it can't be read)
+    """
+    try:
+        with open(path) as f:
+            return int(f.read().split()[0])
+    except (IOError, OSError, ValueError, IndexError):
+        return default
+
+
+def saveBitrate(path, bitrate):
+    d = os.path.dirname(path)
+    if d and not os.path.isdir(d): os.makedirs(d)
+    with open(path, 'w') as f:
+        f.write("%d\n" % bitrate)
+
+
+def headless():
+    """
+    Whether DOTSTAR_BACKEND picks a stand-in rather than the real strip
+    """
+    return os.environ.get('DOTSTAR_BACKEND', 'spi') != 'spi'
+
+
+def openStrip(numLEDs, bitrate=8000000, order='brg'):
+    """
+    Make the strip selected by the DOTSTAR_BACKEND environment variable (see above)
+    """
+    backend = os.environ.get('DOTSTAR_BACKEND', 'spi')
+    realtime = bool(os.environ.get('DOTSTAR_REALTIME'))
+    if backend == 'spi':
+        from dotstar import Adafruit_DotStar
+        return Adafruit_DotStar(numLEDs, bitrate, order=order)
+    if backend == 'memory':
+        return MemoryStrip(numLEDs, bitrate, order=order, realtime=realtime)
+    if backend.startswith('file:'):
+        return MemoryStrip(numLEDs, bitrate, order=order, sink=backend[5:], realtime=realtime)
+    raise ValueError("Unknown DOTSTAR_BACKEND '%s' (use spi, memory or file:<path>)" % backend)